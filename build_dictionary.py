@@ -1,5 +1,26 @@
-from collections import OrderedDict
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from contextlib import contextmanager
+from functools import cached_property, lru_cache, reduce
+import filecmp
+import hashlib
+import inspect
+from itertools import chain, islice
+import json
+from operator import or_
+import os
 import re
+import shutil
+import string
+from time import perf_counter
+
+from transliteration import RomanizationParser, transliterate
+
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
 
 # USE THIS: https://fiatlingua.org/2014/09/
 # AND THIS: https://chridd.nfshost.com/diachronica/index-diachronica.pdf
@@ -30,10 +51,230 @@ plural_marker = 'e'
 
 light_morphemes = ['fe', 'la', 're', 'li']
 
+SYLLABLE_PATTERN = re.compile(fr'([{consonants}]*[{vowels}][{consonants}]*)')
+VOWEL_PATTERN = re.compile(fr'[{vowels}]')
+
+# mark_stress and mark_syllable_boundaries drop these segments, so rules that
+# rebuild the word from them can change it through these segments alone
+OUTSIDE_SYLLABLES = fr'[^{consonants}{vowels}]'
+
+# One bit per segment for trigger checks; anything else shares other_segment
+class SegmentBits(dict):
+    def __missing__(self, segment):
+        return other_segment
+
+segment_bits = SegmentBits((segment, 1 << i) for i, segment in enumerate(
+    dict.fromkeys(consonants + vowels + approximates + 'ɟɸ:' + stress_mark + string.ascii_lowercase)))
+other_segment = 1 << len(segment_bits)
+all_segments = (other_segment << 1) - 1
+
+def segment_mask(segments):
+    mask = 0
+    for segment in segments:
+        mask |= segment_bits[segment]
+    return mask
+
+def class_mask(items):
+    """Segments matched by a parsed [...] class, or all_segments if unknown."""
+    mask = 0
+    negate = False
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            mask |= segment_mask(chr(av))
+        elif op is sre_parse.RANGE and av[1] - av[0] < 256:
+            mask |= segment_mask(map(chr, range(av[0], av[1] + 1)))
+        elif op is sre_parse.NEGATE:
+            negate = True
+        else:
+            return all_segments
+    return all_segments & ~mask if negate else mask
+
+def required_segments(items):
+    """Clauses (segment masks) that must each share a segment with any string
+    the parsed pattern `items` matches."""
+    clauses = []
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            clauses.append(segment_mask(chr(av)))
+        elif op is sre_parse.NOT_LITERAL:
+            clauses.append(all_segments & ~segment_mask(chr(av)))
+        elif op is sre_parse.IN:
+            clauses.append(class_mask(av))
+        elif op is sre_parse.SUBPATTERN:
+            clauses.extend(required_segments(av[-1]))
+        elif op is sre_parse.ASSERT:
+            clauses.extend(required_segments(av[1]))
+        elif op in (sre_parse.MAX_REPEAT, sre_parse.MIN_REPEAT) and av[0] > 0:
+            clauses.extend(required_segments(av[2]))
+        elif op is sre_parse.BRANCH:
+            # one of the alternatives matches, so one of their first clauses
+            alternatives = [required_segments(branch) for branch in av[1]]
+            if all(alternatives):
+                clauses.append(sum_masks(branch[0] for branch in alternatives))
+    return [clause for clause in clauses if clause != all_segments]
+
+def popcount(mask):
+    return bin(mask).count('1')
+
+def sum_masks(masks):
+    total = 0
+    for mask in masks:
+        total |= mask
+    return total
+
+def edge_segment(items, index):
+    """Mask of the segment a pattern needs right after ^ (index 0) or right
+    before $ (index -1), or None."""
+    while items:
+        op, av = items[index]
+        if op is sre_parse.SUBPATTERN:
+            items = av[-1]
+        elif op is sre_parse.LITERAL:
+            return segment_mask(chr(av))
+        elif op is sre_parse.IN:
+            return class_mask(av)
+        else:
+            return None
+    return None
+
+def segment_trigger(patterns):
+    """Build a cheap check that is False only when none of `patterns` can
+    match a Word, judging by its segment inventory (and, for a single
+    pattern, its first and last segments). Returns None when some pattern
+    could match anything."""
+    alternatives = []
+    for pattern in patterns:
+        items = list(sre_parse.parse(pattern))
+        first = last = None
+        if len(items) > 1 and items[0] == (sre_parse.AT, sre_parse.AT_BEGINNING):
+            first = edge_segment(items[1:], 0)
+        if len(items) > 1 and items[-1] == (sre_parse.AT, sre_parse.AT_END):
+            last = edge_segment(items[:-1], -1)
+        clauses = required_segments(items)
+        if not clauses and first is None and last is None:
+            return None
+        alternatives.append((clauses, first, last))
+
+    if len(alternatives) > 1:
+        # Any alternative may fire, so only require the narrowest clause of one
+        any_of = sum_masks(min(clauses or [first or last], key=popcount) for clauses, first, last in alternatives)
+        trigger = lambda word: word.segments & any_of != 0
+        trigger.needs = any_of
+        return trigger
+
+    (clauses, first, last), = alternatives
+    all_of = sum_masks(clause for clause in clauses if popcount(clause) == 1)
+    if all_of:
+        # Required single segments are selective enough on their own
+        trigger = lambda word: word.segments & all_of == all_of
+        trigger.needs = all_of
+        return trigger
+    some_of = list(dict.fromkeys(clauses))
+    def trigger(word):
+        segments = word.segments
+        return (segments & all_of == all_of
+                and all(segments & clause for clause in some_of)
+                and (first is None or segment_bits.get(word[:1], other_segment) & first != 0)
+                and (last is None or segment_bits.get(word[-1:], other_segment) & last != 0))
+    trigger.needs = some_of[0] if some_of else first if first is not None else last
+    return trigger
+
+def requires(*patterns):
+    """Declare the patterns a rule function needs: if none of them matches
+    the (unstressed) word, the function leaves it unchanged."""
+    def declare(function):
+        function.requires = patterns
+        return function
+    return declare
+
+
+class Rewrite:
+    """A sound change made of ordered (pattern, replacement) substitutions.
+
+    Patterns are compiled once when the rule is defined. Patterns without
+    regex syntax (and with a plain replacement) are applied with str.replace.
+    When every step is literal, a Word only runs the steps whose segments it
+    has (or gains from earlier steps); the selection is looked up by the
+    Word's segment inventory.
+
+    A `stressed` rewrite applies its steps to the word with stress marked
+    (see mark_stress) and unmarks the result; `requires` then lists the
+    patterns it needs in the unmarked word, as with @requires.
+    """
+    __slots__ = ('steps', 'stressed', 'requires', 'step_segments', '_selections')
+
+    def __init__(self, *steps, stressed=False, requires=None):
+        compiled = []
+        for pattern, replacement in steps:
+            literal = (re.escape(pattern) == pattern and isinstance(replacement, str)
+                       and '\\' not in replacement)
+            compiled.append((pattern if literal else re.compile(pattern), replacement))
+        self.steps = tuple(compiled)
+        self.stressed = stressed
+        self.requires = requires
+        if not stressed and all(isinstance(pattern, str) for pattern, _ in self.steps):
+            self.step_segments = tuple((segment_mask(pattern), segment_mask(replacement))
+                                       for pattern, replacement in self.steps)
+        else:
+            self.step_segments = None
+        self._selections = {}
+
+    def select(self, segments):
+        """The steps that can apply to a word with the `segments` inventory."""
+        selected = self._selections.get(segments)
+        if selected is None:
+            selected = []
+            available = segments
+            for step, (needed, produced) in zip(self.steps, self.step_segments):
+                if available & needed == needed:
+                    selected.append(step)
+                    available |= produced
+            selected = self._selections[segments] = tuple(selected)
+        return selected
+
+    def __call__(self, word):
+        if self.step_segments is not None and isinstance(word, Word):
+            for pattern, replacement in self.select(word.segments):
+                word = word.replace(pattern, replacement)
+            return word
+        if self.stressed:
+            word = mark_stress(word)
+        for pattern, replacement in self.steps:
+            if isinstance(pattern, str):
+                word = word.replace(pattern, replacement)
+            else:
+                word = pattern.sub(replacement, word)
+        return unmark_stress(word) if self.stressed else word
+
+    def __repr__(self):
+        steps = ', '.join(f'{getattr(p, "pattern", p)!r} → {r!r}' for p, r in self.steps)
+        return f'Rewrite({steps})'
+
+
+class Word(str):
+    """A surface form whose syllables and stress are computed on first use.
+
+    apply_sound_changes wraps each new form once, so every stress-sensitive
+    rule that sees the same form shares a single analysis.
+    """
+
+    @cached_property
+    def syllables(self):
+        return tuple(SYLLABLE_PATTERN.findall(self))
+
+    @cached_property
+    def stressed(self):
+        return stress_syllables(self, list(self.syllables))
+
+    @cached_property
+    def segments(self):
+        return reduce(or_, map(segment_bits.__getitem__, set(self)), 0)
+
+
 def find_syllables(word):
-    pattern = fr'([{consonants}]*[{vowels}][{consonants}]*)'
-    syllables = re.findall(pattern, word)
-    return syllables
+    if isinstance(word, Word):
+        return list(word.syllables)
+    return SYLLABLE_PATTERN.findall(word)
 
 def count_syllables(word):
     syllables = find_syllables(word)
@@ -48,18 +289,25 @@ def mark_syllable_boundaries(word):
     return marked_word
 
 def mark_stress(word):
-    # Define the pattern to capture syllables
+    if isinstance(word, Word):
+        return word.stressed
     # Find all syllables in the word
-    syllables = find_syllables(word)
+    return stress_syllables(word, find_syllables(word))
+
+# Forms stress_syllables found no syllables in, counted for main()'s summary
+unsyllabified = Counter()
+
+def stress_syllables(word, syllables):
     if len(syllables) == 0:
-        print(f'No syllables found in {word}')
-        return word
+        unsyllabified[word] += 1
+        log(f'No syllables found in {word}', VERBOSE)
+        return str(word)
     # Determine which syllable to stress
     if len(syllables) > 1:
         # Find the stressed syllable (penultimate)
         stressed_syllable = syllables[-2]
         # Find the position of the vowel in the stressed syllable
-        match = re.search(fr'[{vowels}]', stressed_syllable)
+        match = VOWEL_PATTERN.search(stressed_syllable)
         if match:
             # Insert the stress mark before the vowel
             stressed_syllable = stressed_syllable[:match.start()] + stress_mark + stressed_syllable[match.start():]
@@ -67,7 +315,7 @@ def mark_stress(word):
         syllables[-2] = stressed_syllable
     else:
         # Find the position of the vowel in the only syllable
-        match = re.search(fr'[{vowels}]', syllables[0])
+        match = VOWEL_PATTERN.search(syllables[0])
         if match:
             # Insert the stress mark before the vowel
             syllables[0] = syllables[0][:match.start()] + stress_mark + syllables[0][match.start():]
@@ -80,6 +328,7 @@ def mark_stress(word):
 def unmark_stress(word):
     return word.replace(stress_mark, "")
 
+@lru_cache(maxsize=1 << 16)
 def dotted_with_stress(word):
     """Return a display-only IPA with syllable dots and stress mark.
     Expects an undecorated word (no stress marks)."""
@@ -88,177 +337,111 @@ def dotted_with_stress(word):
         return word
     idx = 0 if len(syllables) == 1 else len(syllables) - 2
     # insert stress before the first vowel in the target syllable
-    m = re.search(fr'[{vowels}]', syllables[idx])
+    m = VOWEL_PATTERN.search(syllables[idx])
     if m:
         s = syllables[idx]
         syllables[idx] = s[:m.start()] + stress_mark + s[m.start():]
     return '.'.join(syllables)
 
+UNSTRESSED_VOWEL_BETWEEN_VOICELESS = re.compile(f"([{voiceless_consonants}])([{vowels}])([{voiceless_consonants}])")
+
+@requires(UNSTRESSED_VOWEL_BETWEEN_VOICELESS.pattern, OUTSIDE_SYLLABLES)
 def vowel_loss_between_voiceless_consonants_unless_stressed(word):
-    pattern = f"([{voiceless_consonants}])([{vowels}])([{voiceless_consonants}])"
     stressed = mark_stress(word)
-    
-    def replacement(match):
-        # will only match unstressed vowels, since stressed vowels are marked with an apostrophe
-        preceding, _, following = match.groups()
-        return preceding + following  # Apply the transformation if unstressed
-    
-    return unmark_stress(re.sub(pattern, replacement, stressed))
+    # will only match unstressed vowels, since stressed vowels are marked with an apostrophe
+    return unmark_stress(UNSTRESSED_VOWEL_BETWEEN_VOICELESS.sub(r'\1\3', stressed))
 
 
-def h_to_ħ(word):
-    return word.replace('h', 'ħ')
+voiced_sounds = f'{vowels}{voiced_consonants}'
 
-def b_to_d(word):
-    return word.replace('b', 'd')
+voiceless_stop_to_voiced_between_voiced = Rewrite(*[
+    (f"([{voiced_sounds}]){voiceless}([{voiced_sounds}])", r'\1' + voiced + r'\2')
+    for voiceless, voiced in {'p': 'b', 't': 'd', 'k': 'g'}.items()
+])
 
-def voiceless_stop_to_voiced_between_voiced(word):
-    voiced_sounds = f'{vowels}{voiced_consonants}'
-    voiceless_stops = {
-        'p': 'b',
-        't': 'd',
-        'k': 'g'
-    }
-    for voiceless, voiced in voiceless_stops.items():
-        pattern = f"([{voiced_sounds}]){voiceless}([{voiced_sounds}])"
-        word = re.sub(pattern, r'\1' + voiced + r'\2', word)
-    return word
+# Remove the last character of the cluster, which is a voiceless stop
+no_voiceless_stops_in_clusters = Rewrite(
+    (f"([{consonants}]+[{voiceless_stops}])", lambda match: match.group(0)[:-1]),
+)
 
-def no_voiceless_stops_in_clusters(word):
-    pattern = f"([{consonants}]+[{voiceless_stops}])"
 
-    def replacement(match):
-        # Extract the matched cluster
-        cluster = match.group(0)
-        # Find the first voiceless stop in the cluster and return the cluster without the last voiceless stop
-        return cluster[:-1]  # Remove the last character which is a voiceless stop
+no_stops_after_fricatives = Rewrite(*[(fric + stop, fric) for fric in fricatives for stop in stops])
 
-    return re.sub(pattern, replacement, word)
+no_stops_after_liquids = Rewrite(*[(liquid + stop, liquid) for liquid in liquids for stop in stops])
 
+no_stops_after_glides = Rewrite(*[(glide + stop, glide) for glide in glides for stop in stops])
 
-def change_bardotlessj(word):
-    return word.replace('ɟ', 'j')
+# word_finally or before voiceless consonants
+velar_hardening = Rewrite((fr'k(?=[{voiceless_consonants}]|$)', 'k'))
 
-def no_stops_after_fricatives(word):
-    for fric in fricatives:
-        for stop in stops:
-            pattern = fric + stop
-            word = word.replace(pattern, fric)
-    return word
+no_fricative_clusters = Rewrite((f"([{fricatives}])[{fricatives}]", r'\1'))
 
-def no_stops_after_liquids(word):
-    for liquid in liquids:
-        for stop in stops:
-            pattern = liquid + stop
-            word = word.replace(pattern, liquid)
-    return word
+vowel_combinations = Rewrite(
+    (fr'ai(?=[^{vowels}]|$)', 'i'),
+    ('aa', 'a'),
+    ('ei', 'e'),
+)
 
-def no_stops_after_glides(word):
-    for glide in glides:
-        for stop in stops:
-            pattern = glide + stop
-            word = word.replace(pattern, glide)
-    return word
+no_double_consonants = Rewrite(*[(consonant + consonant, consonant) for consonant in consonants])
 
-def velar_hardening(word):
-    # word_finally or before voiceless consonants
-    pattern = fr'k(?=[{voiceless_consonants}]|$)'
-    return re.sub(pattern, 'k', word)
+no_repeated_vowels = Rewrite(*[(vowel + vowel, vowel) for vowel in vowels])
 
-def no_fricative_clusters(word):
-    pattern = f"[{fricatives}][{fricatives}]"
-    return re.sub(pattern, lambda x: x.group()[0], word)
+approximate_loss_after_o_or_u = Rewrite((fr'([ou])([{approximates}])', r'\1'))
 
-def loss_of_h(word):
-    # Remove 'h' between vowels or at the end of the word
-    word = re.sub(fr'(?<=[{vowels}])h([{vowels}])', r'\1', word)
-    word = re.sub(r'h$', '', word)
-    return word
+vowel_loss_before_approximate = Rewrite((fr'([{vowels}])([{approximates}])', r'\2'))
 
-def vowel_combinations(word):
-    word = re.sub(fr'ai(?=[^{vowels}]|$)', 'i', word)
-    word = re.sub(r'aa', 'a', word)
-    word = re.sub(r'ei', 'e', word)
-    return word
+nasal_assimilations = {
+    'md': 'nd',
+    'np': 'mp',
+    'nk': 'ŋg',
+    'ng': 'ŋg',
+    'nt': 'nd',
+    'nc': 'ŋg',
+    'nj': 'ndʒ',
+    'ŋk': 'ŋg',
+}
 
-def no_double_consonants(word):
-    for consonant in consonants:
-        pattern = f"{consonant}{consonant}"
-        word = word.replace(pattern, consonant)
-    return word
+# The clusters never overlap, so one alternation matches applying them in turn
+nasal_assimilation = Rewrite(
+    ('|'.join(nasal_assimilations), lambda match: nasal_assimilations[match.group()]),
+)
 
-def no_repeated_vowels(word):
-    for vowel in vowels:
-        pattern = f"{vowel}{vowel}"
-        word = word.replace(pattern, vowel)
-    return word
-
-def approximate_loss_after_o_or_u(word):
-    pattern = fr'([ou])([{approximates}])'
-    return re.sub(pattern, r'\1', word)
-
-def vowel_loss_before_approximate(word):
-    pattern = fr'([{vowels}])([{approximates}])'
-    return re.sub(pattern, r'\2', word)
-
-def nasal_assimilation(word):
-    # Define the replacements
-    replacements = {
-        r'md': 'nd',
-        r'np': 'mp',
-        r'nk': 'ŋg',
-        r'ng': 'ŋg', 
-        r'nt': 'nd',
-        r'nc': 'ŋg',
-        r'nj': 'ndʒ',
-        r'ŋk': 'ŋg',
-    }
-    
-    # Apply each replacement using regular expressions
-    for pat, repl in replacements.items():
-        word = re.sub(pat, repl, word)
-    
-    return word
 
+STRESSED_INITIAL_VOWEL = re.compile(fr'^{stress_mark}[{vowels}]')
+INITIAL_VOWEL = re.compile(fr'^([{vowels}])')
 
+@requires(INITIAL_VOWEL.pattern)
 def word_initial_vowel_loss_unless_stressed(word):
     stressed = mark_stress(word)
     # Do not apply if the vowel is stressed (has an apostrophe after it)
-    if re.match(fr'^{stress_mark}[{vowels}]', stressed):
+    if STRESSED_INITIAL_VOWEL.match(stressed):
         return word
     # Apply the rule otherwise
-    return re.sub(fr'^([{vowels}])', '', word)
+    return INITIAL_VOWEL.sub('', word)
 
-def f_to_phi_at_word_end(word):
-    return re.sub(r'f$', 'ɸ', word)
+STRESSED_FINAL_VOWEL = re.compile(fr'{stress_mark}[{vowels}]$')
+FINAL_VOWEL = re.compile(fr'([{vowels}])$')
 
+@requires(FINAL_VOWEL.pattern)
 def word_final_vowel_loss_unless_stressed(word):
     stressed = mark_stress(word)
     # Do not apply if the vowel is stressed (has an apostrophe before it)
-    if re.search(fr'{stress_mark}[{vowels}]$', stressed):
+    if STRESSED_FINAL_VOWEL.search(stressed):
         return word
     # Apply the rule otherwise
-    pattern = fr'([{vowels}])$'
-    return re.sub(pattern, '', word)
+    return FINAL_VOWEL.sub('', word)
 
 
 
-#θ → s / _k
-def theta_s_before_k(word):
-    pattern = r'θ(?=k)'
-    return re.sub(pattern, 's', word)
-
-#θ → t / {p,t,k}_
-def theta_t_after_voiceless_stops(word):
-    pattern = fr'(?<=[{voiceless_stops}])θ'
-    return re.sub(pattern, 't', word)
+THETA_IR = re.compile(r'θir')
 
+@requires(THETA_IR.pattern)
 def theta_r(word):
     # Get the stressed version of the word
     stressed = mark_stress(word)
 
     # Find all occurrences of "θir"
-    matches = list(re.finditer(r'θir', word))
+    matches = list(THETA_IR.finditer(word))
     
     # Create a new word to store the transformation result
     new_word = list(word)
@@ -267,7 +450,7 @@ def theta_r(word):
     offset = 0
     for match in matches:
         start, end = match.span()
-        if not re.search(rf"θ{stress_mark}i", stressed[start:end]):
+        if f"θ{stress_mark}i" not in stressed[start:end]:
             # Apply the transformation
             new_word[start + offset:end + offset] = 'θr'
             offset += -1  # Adjust offset due to length change (3 characters "θir" -> 2 characters "θr")
@@ -275,118 +458,61 @@ def theta_r(word):
     return ''.join(new_word)
 
 
-def no_stops_after_nasals(word):
-    pattern = fr'([{nasals}])([{stops}])'
-    return re.sub(pattern, r'\1', word)
+no_stops_after_nasals = Rewrite((fr'([{nasals}])([{stops}])', r'\1'))
+
+nasal_stop_clusters = [(nasal, nasal + stop) for nasal in nasals for stop in stops]
 
+@requires(fr'[{nasals}][{stops}]', OUTSIDE_SYLLABLES)
 def no_stops_after_nasals_except_when_split_syllable(word):
     syl = mark_syllable_boundaries(word)
     parts = syl.split('.')
     new_parts = []
     for part in parts:
-        for nasal in nasals:
-            for stop in stops:
-                pattern = nasal + stop
-                if pattern in part:
-                    # only remove if not split syllable
-                    if len(part) > 2 and part.index(pattern) != 0 and part.index(pattern) != len(part)-2:
-                        part = part.replace(pattern, nasal)
+        for nasal, pattern in nasal_stop_clusters:
+            if pattern in part:
+                # only remove if not split syllable
+                if len(part) > 2 and part.index(pattern) != 0 and part.index(pattern) != len(part)-2:
+                    part = part.replace(pattern, nasal)
         new_parts.append(part)
     return ''.join(new_parts)
 
-def no_stops_after_sonorants(word):
-    for sonorant in sonorants:
-        for stop in stops:
-            pattern = sonorant + stop
-            word = word.replace(pattern, sonorant)
-    return word
-
-
-def ae_to_a(word):
-    return word.replace('ae', 'a')
-
-def p_b_to_m(word): # TODO
-    stops = 'pb'
-    for stop in stops:
-        word = re.sub(f'{stop}(?=[^{vowels}]|$)', 'm', word)
-    return word
-
-def no_final_e(word):
-    pattern = fr'([e])$'
-    return re.sub(pattern, '', word)
+no_stops_after_sonorants = Rewrite(*[(sonorant + stop, sonorant) for sonorant in sonorants for stop in stops])
 
-def y_to_sh(word):
-    return word.replace('ʒ', 'ʃ')
 
-def z_to_s(word):
-    return word.replace('z', 's')
+p_b_to_m = Rewrite(*[(f'{stop}(?=[^{vowels}]|$)', 'm') for stop in 'pb']) # TODO
 
-def unvoice_th(word):
-    return word.replace('ð', 'θ')
+rhotacism_between_glides = Rewrite((f'([{glides}])r([{glides}])', r'\1r\2'))
 
-def rhotacism_between_glides(word):
-    pattern = f'([{glides}])r([{glides}])'
-    return re.sub(pattern, r'\1r\2', word)
+rhotacism_between_vowels = Rewrite((f'([{vowels}])r([{vowels}])', r'\1r\2'))
 
-def rhotacism_between_vowels(word):
-    pattern = f'([{vowels}])r([{vowels}])'
-    return re.sub(pattern, r'\1r\2', word)
+# Replace affricates followed by fricatives with just the affricate
+no_fricatives_after_affricates = Rewrite((f'([{affricates}])([{fricatives}])', r'\1'))
 
-def no_fricatives_after_affricates(word):
-    # Define the pattern to match affricates followed by fricatives
-    pattern = f'([{affricates}])([{fricatives}])'
-    # Replace the matched pattern with just the affricate
-    return re.sub(pattern, r'\1', word)
-
-def no_affricates_after_fricatives(word):
-    # Define the pattern to match fricatives followed by affricates
-    pattern = f'([{fricatives}])([{affricates}])'
-    # Replace the matched pattern with just the fricative
-    return re.sub(pattern, r'\1', word)
-
-#s → ∅ / V_V 
-def loss_of_s_between_vowels(word):
-    pattern = fr'(?<=[{vowels}])s(?=[{vowels}])'
-    return re.sub(pattern, '', word)
+# Replace fricatives followed by affricates with just the fricative
+no_affricates_after_fricatives = Rewrite((f'([{fricatives}])([{affricates}])', r'\1'))
 
 #Stop Cluster Simplification
-def stop_cluster_simplification(word):
-    # /pt/, /kt/, /pk/ → /p/, /k/, /p/
-    pattern = r'pt|kt|pk'
-    return re.sub(pattern, lambda m: m.group()[0], word)
+# /pt/, /kt/, /pk/ → /p/, /k/, /p/
+stop_cluster_simplification = Rewrite((r'pt|kt|pk', lambda m: m.group()[0]))
 
 # Fricative Clusters Harden with Epenthetic Stops
-def fricative_cluster_hardening(word):
-    # /sʃ/ → /tsʃ/, /ɬʃ/ → /tɬʃ/
-    pattern = r'sʃ|ɬʃ'
-    return re.sub(pattern, lambda m: 't' + m.group(), word)
-
-# /ʃd/ → [ɬt]
-def shd_to_lht(word):
-    pattern = r'ʃd'
-    return re.sub(pattern, 'ɬt', word)
+# /sʃ/ → /tsʃ/, /ɬʃ/ → /tɬʃ/
+fricative_cluster_hardening = Rewrite((r'sʃ|ɬʃ', r't\g<0>'))
 
-#  Nasal Deletion Before Voiceless Obstruents
-def nasal_deletion_before_voiceless_obstruents(word):
-    #/n/ → ∅ / __[p t k f θ ʃ]
-    pattern = fr'n(?=[{voiceless_consonants}])'
-    return re.sub(pattern, '', word)
-
-
-def schwa_deletion(word):
-    return word.replace('ə', '')
 
 
 # Reduplicant Vowel Reduction
 # Rule: CV-CV → Cə-CV
+STRESSED_REDUPLICANT = re.compile(fr'^([{consonants}]){stress_mark}([{vowels}])\1([{vowels}])')
+REDUPLICANT = re.compile(fr'^([{consonants}])([{vowels}])\1([{vowels}])')
+
+@requires(REDUPLICANT.pattern)
 def reduplicant_vowel_reduction(word):
     stressed_word = mark_stress(word)
     # except when stressed
-    stressed_pattern = fr'^([{consonants}]){stress_mark}([{vowels}])\1([{vowels}])'
-    if re.match(stressed_pattern, stressed_word):
+    if STRESSED_REDUPLICANT.match(stressed_word):
         return word
-    pattern = fr'^([{consonants}])([{vowels}])\1([{vowels}])'
-    return re.sub(pattern, r'\1ə\1\3', word)
+    return REDUPLICANT.sub(r'\1ə\1\3', word)
 
 
 # /npk/ → /nk/ or /pk/ (depends on syllabification)
@@ -397,18 +523,20 @@ def npk_to_nk_or_pk(word):
     # Check if the first syllable ends with 'n' and the second starts with 'p'
 
 
-def simplify_hn_to_n(word):
-    return re.sub(r'hn', 'n', word)
+# e.g., /-rks/ → /-ks/, /-ndr/ → /-r/
+FINAL_CLUSTER = re.compile(fr'([{consonants}])([{consonants}])$')
 
+@requires(FINAL_CLUSTER.pattern)
 def simplify_final_clusters(word):
-    # e.g., /-rks/ → /-ks/, /-ndr/ → /-r/
-    pattern = fr'([{consonants}])([{consonants}])$'
     # thr is allowed
     if word.endswith('θr'):
         return word
-    return re.sub(pattern, r'\1', word)
+    return FINAL_CLUSTER.sub(r'\1', word)
 
 
+CVC = re.compile(fr'([{consonants}])([{vowels}])([{consonants}])')
+
+@requires(OUTSIDE_SYLLABLES)
 def medial_syncope_unless_stressed(word):
     stressed = mark_stress(word)
     syllables = find_syllables(word)
@@ -420,306 +548,893 @@ def medial_syncope_unless_stressed(word):
     if stress_mark in middle_syllable:
         return word
     # Remove the vowel from the middle syllable
-    pattern = fr'([{consonants}])([{vowels}])([{consonants}])'
     parts = stressed.split('.')
     new_parts = []
     for i, part in enumerate(parts):
         if i == middle_index:
             # Remove the vowel from this part
-            part = re.sub(pattern, r'\1\3', part)
+            part = CVC.sub(r'\1\3', part)
         new_parts.append(part)
     return ''.join(new_parts)
 
+# Only delete if surrounded by other content and not stressed
+light_morpheme_patterns = [re.compile(f'([a-z]+){morpheme}([a-z]+)') for morpheme in light_morphemes]
+
+@requires(*[pattern.pattern for pattern in light_morpheme_patterns], OUTSIDE_SYLLABLES)
 def light_morpheme_simplification(word):
     stressed = mark_stress(word)
-    for morpheme in light_morphemes:
-        # Only delete if surrounded by other content and not stressed
-        pattern = f'([a-z]+){morpheme}([a-z]+)'
-        new_word = re.sub(pattern, r'\1\2', stressed)
+    for pattern in light_morpheme_patterns:
+        new_word = pattern.sub(r'\1\2', stressed)
         if new_word != word:
             return unmark_stress(new_word)
     return unmark_stress(word)
 
+# Match repeated syllables: e.g., la-la → la
+REPEATED_SYLLABLE = re.compile(r'(\b\w{1,2})\1')
+
 def reduplication_simplification(word):
     if count_syllables(word) < 3:
         return word
-    # Match repeated syllables: e.g., la-la → la
-    return re.sub(r'(\b\w{1,2})\1', r'\1', word)
+    return REPEATED_SYLLABLE.sub(r'\1', word)
 
 
-def onset_cluster_simplification(word):
-    # Simplify illegal CCC onsets, e.g., stl → sl or remove first C
-    return re.sub(fr'\b([{consonants}])([{consonants}])([{consonants}])', r'\2\3', word)
+# Simplify illegal CCC onsets, e.g., stl → sl or remove first C
+onset_cluster_simplification = Rewrite((fr'\b([{consonants}])([{consonants}])([{consonants}])', r'\2\3'))
 
 
+@requires(CVC.pattern, OUTSIDE_SYLLABLES)
 def medial_vowel_loss(word):
     # Removes a medial unstressed vowel between consonants
     stressed = mark_stress(word)
-    return unmark_stress(re.sub(fr'([{consonants}])([{vowels}])([{consonants}])', r'\1\3', stressed))
+    return unmark_stress(CVC.sub(r'\1\3', stressed))
 
 
+SONORANT_CLUSTER = re.compile(fr'([{sonorants}])([{sonorants}])')
+
+@requires(SONORANT_CLUSTER.pattern)
 def simplify_sonorant_clusters_excluding_initial_mr(word):
     # e.g. lr → r, ln → n
     # Simplify sonorant+sonorant (l/r/m/n) sequences where awkward
-    # return re.sub(fr'([{sonorants}])([{sonorants}])', r'\2', word)
     # except when initial mr
     if word.startswith('mr'):
         rest = word[2:]
-        simplified_rest = re.sub(fr'([{sonorants}])([{sonorants}])', r'\2', rest)
+        simplified_rest = SONORANT_CLUSTER.sub(r'\2', rest)
         return 'mr' + simplified_rest
     else:
-        return re.sub(fr'([{sonorants}])([{sonorants}])', r'\2', word)
-
-
-def simplify_fricative_nasal_clusters(word):
-    for fric in fricatives:
-        for nasal in nasals:
-            pattern = fric + nasal
-            word = word.replace(pattern, nasal)
-    return word
-
-
-def simplify_initial_tl_n_cluster(word):
-    return re.sub(r'^ƛn', 'n', word)
-
-
-def simplify_initial_mf_to_m(word):
-    return re.sub(r'^mf', 'm', word)
-
-def epenthesis_in_initial_ml(word):
-    return re.sub(r'^ml', 'mel', word)
-
-def epenthesis_in_initial_lm(word):
-    return re.sub(r'^lm', 'lem', word)
-
-def epenthesis_in_initial_fm(word):
-    return re.sub(r'^fm', 'fem', word)
-
-def simplify_fricative_liquid_clusters(word):
-    for fric in fricatives:
-        for liquid in liquids:
-            cluster = fric + liquid
-            if cluster == 'θr':
-                continue  # θr is allowed
-            if cluster in word:
-                # Default simplification: delete the liquid
-                word = word.replace(cluster, fric)
-    return word
-
+        return SONORANT_CLUSTER.sub(r'\2', word)
 
-def epenthetic_vowel_in_initial_double_nasal(word):
-    return re.sub(fr'^([{nasals}])([{nasals}])', r'\1u\2', word)
 
+simplify_fricative_nasal_clusters = Rewrite(*[(fric + nasal, nasal) for fric in fricatives for nasal in nasals])
 
-def simplify_final_stop_sonorant_clusters(word):
-    return re.sub(fr'([{stops}])([{sonorants}])$', r'\2', word)
 
-def simplify_g_tl(word):
-    return re.sub(r'gƛ', 'ƛ', word) 
 
-def simplify_tl_to_ƛ(word):
-    return re.sub(r'tl', 'ƛ', word)
+# Default simplification: delete the liquid (θr is allowed)
+simplify_fricative_liquid_clusters = Rewrite(*[
+    (fric + liquid, fric) for fric in fricatives for liquid in liquids if fric + liquid != 'θr'
+])
 
-def simplify_lh_to_ɬ(word):
-    return re.sub(r'lh', 'ɬ', word)
 
-def wiw_to_win(word):
-    return re.sub(r'wiw', 'win', word)  
+epenthetic_vowel_in_initial_double_nasal = Rewrite((fr'^([{nasals}])([{nasals}])', r'\1u\2'))
 
-def epenthesis_in_ƛd_cluster(word):
-    return re.sub(r'ƛd', 'ƛod', word)
 
-def epenthesis_in_initial_t_sh_cluster(word):
-    return re.sub(r'^tʃ', 'teʃ', word)
+simplify_final_stop_sonorant_clusters = Rewrite((fr'([{stops}])([{sonorants}])$', r'\2'))
 
-def simplify_lθ_to_θ(word):
-    return re.sub(r'lθ', 'θ', word)
 
+# Avoid fricative-vowel-fricative-vowel-fricative patterns (e.g., iθiθ to iθit)
+dissimilate_fricative_reduplication = Rewrite(*[
+    (fr'([{vowels}]){k}([{vowels}]){k}', fr'\1{k}\2{v}')
+    for k, v in {'θ': 't', 'ʃ': 'd', 'ɬ': 'l'}.items()
+])
 
-def dissimilate_fricative_reduplication(word):
-    # Avoid fricative-vowel-fricative-vowel-fricative patterns (e.g., iθiθ to iθit)
-    replacements = {
-        'θ': 't',
-        'ʃ': 'd',
-        'ɬ': 'l',
-    }
-    for k,v in replacements.items():
-        pattern = fr'([{vowels}]){k}([{vowels}]){k}'
-        word = re.sub(pattern, fr'\1{k}\2{v}', word)
-    return word
-
-
-def metathesize_lr(word):
-    return re.sub(r'lr', 'rl', word)
-def metathesize_jf(word):
-    return re.sub(r'jf', 'fj', word)
-
-def epenthesize_initial_nθ(word):
-    return re.sub(r'^nθ', 'meθ', word)
-
-def nasal_assimilation_mθ_to_nθ(word):
-    return re.sub(r'mθ', 'nθ', word)
-
-def simplify_dg_cluster(word):
-    return word.replace('dg', 'g') 
-
-def unstressed_ie_to_e(word):
-    stressed = mark_stress(word)
-    return unmark_stress(re.sub(r'(?<!ˈ)ie', 'e', stressed))
 
+@requires('ie', OUTSIDE_SYLLABLES)
 def stressed_ie_to_long_i(word):
     stressed = mark_stress(word)
-    return unmark_stress(re.sub(r'iˈe', 'i:', stressed))
+    return unmark_stress(stressed.replace('iˈe', 'i:'))
+
+glide_epenthesis_after_unstressed_i = Rewrite((fr'(?<!ˈ)i([{vowels}])', r'ij\1'))
+
+glide_epenthesis_after_unstressed_u = Rewrite((fr'(?<!ˈ)u([{vowels}])', r'uw\1'))
+
+
+class SoundChange:
+    """One numbered step of the cascade. Rewrite rules also expose their
+    compiled (pattern, replacement) steps; `literal` rules only use
+    str.replace, so they can run over many words joined together.
+
+    `trigger` is derived from the Rewrite patterns or from the function's
+    @requires patterns; it returns False for a Word the rule cannot change.
+    It is None for rules that have to run on every word. Stressed rewrites
+    see more than the word itself, so they count as functions here.
+    """
+    __slots__ = ('rule', 'description', 'function', 'steps', 'literal', 'trigger')
+
+    def __init__(self, rule, description, function):
+        self.rule = rule
+        self.description = description
+        self.function = function
+        self.steps = function.steps if isinstance(function, Rewrite) and not function.stressed else None
+        self.literal = self.steps is not None and all(
+            isinstance(pattern, str) and '\n' not in pattern + replacement for pattern, replacement in self.steps)
+        patterns = getattr(function, 'requires', None)
+        if patterns is None and self.steps is not None:
+            patterns = [getattr(pattern, 'pattern', pattern) for pattern, _ in self.steps]
+        self.trigger = segment_trigger(patterns) if patterns is not None else None
+
+    def apply(self, word):
+        return self.function(word)
+
+    def __repr__(self):
+        return f'SoundChange({self.rule}, {self.description!r})'
+
+# Class symbols of the sound_changes.txt notation
+notation_classes = {
+    'V': vowels,
+    'C': consonants,
+    'S': stops,
+    'P': voiceless_stops,
+    'N': nasals,
+    'L': liquids,
+    'G': glides,
+    'R': sonorants,
+    'F': fricatives,
+    'X': affricates,
+    'A': approximates,
+    'D': voiced_consonants,
+    'T': voiceless_consonants,
+}
+
+NOTATION_STRESS = re.compile(r'\s*\[([+-])stress\]\s*$')
+
+def notation_pattern(segments):
+    """Regex for a sequence of segments, class symbols and {a,b} sets."""
+    pattern = ''
+    for part in re.findall(r'\{[^}]*\}|.', segments):
+        if part in notation_classes:
+            pattern += f'[{notation_classes[part]}]'
+        elif part.startswith('{'):
+            pattern += '[' + ''.join(re.escape(segment.strip()) for segment in part[1:-1].split(',')) + ']'
+        else:
+            pattern += re.escape(part)
+    return pattern
+
+def compile_notation(notation):
+    """Compile 'A → B / X_Y' changes, separated by ';', into a Rewrite.
+
+    A change without an environment or stress condition whose target is
+    plain segments stays a literal str.replace step; otherwise the
+    environment becomes lookarounds, and # anchors the word boundary.
+    """
+    steps = []
+    requires = []
+    stress = set()
+    for change in notation.split(';'):
+        condition = NOTATION_STRESS.search(change)
+        if condition:
+            stress.add(condition.group(1))
+            change = change[:condition.start()]
+        target, arrow, rest = change.replace('->', '→').partition('→')
+        replacement, _, environment = rest.partition('/')
+        target, replacement, environment = target.strip(), replacement.strip(), environment.strip()
+        if not arrow or not target or (environment and environment.count('_') != 1):
+            raise ValueError(f'Cannot parse sound change {change.strip()!r}')
+        replacement = '' if replacement == '∅' else replacement
+        before, _, after = environment.partition('_')
+        # the anchors go inside the lookarounds: a lookbehind cannot match
+        # after ^, nor a lookahead before $
+        before = ('^' + notation_pattern(before[1:])) if before.startswith('#') else notation_pattern(before)
+        after = (notation_pattern(after[:-1]) + '$') if after.endswith('#') else notation_pattern(after)
+        left = before if before == '^' else f'(?<={before})' if before else ''
+        right = after if after == '$' else f'(?={after})' if after else ''
+        pattern = notation_pattern(target)
+        requires.append(left + pattern + right)
+        if condition and condition.group(1) == '+':
+            # the stress mark is right before the stressed vowel, inside the
+            # left environment
+            left = f'(?<={before}{stress_mark})'
+        elif condition:
+            left += f'(?<!{stress_mark})'
+        steps.append((left + pattern + right, replacement))
+    if len(stress) > 1:
+        raise ValueError(f'Mixed stress conditions in {notation!r}')
+    if stress:
+        return Rewrite(*steps, stressed=True, requires=(*requires, OUTSIDE_SYLLABLES))
+    return Rewrite(*steps)
+
+def load_sound_changes(filename):
+    """Read the cascade from `filename`: one 'number | description | change'
+    line per rule, where the change is written in A → B / X_Y notation or
+    names a rule defined in this module. Rules are sorted by number; rules
+    with the same number keep their order in the file."""
+    changes = []
+    with open(filename, encoding='utf-8') as file:
+        for line_number, line in enumerate(file, 1):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            fields = [field.strip() for field in line.split('|')]
+            if len(fields) != 3 or not fields[0].isdigit():
+                raise ValueError(f'{filename}:{line_number}: expected "number | description | change"')
+            rule, description, change = fields
+            if change.isidentifier():
+                if change not in globals():
+                    raise ValueError(f'{filename}:{line_number}: no rule named {change}')
+                function = globals()[change]
+            else:
+                function = compile_notation(change)
+            changes.append(SoundChange(int(rule), description, function))
+    changes.sort(key=lambda change: change.rule)
+    return changes
 
-def glide_epenthesis_after_unstressed_i(word):
-    word = re.sub(fr'(?<!ˈ)i([{vowels}])', r'ij\1', word)
+# List of sound changes
+sound_changes = load_sound_changes(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sound_changes.txt'))
+
+rule_numbers = [change.rule for change in sound_changes]
+
+# How much main() reports: QUIET only warnings, SUMMARY one line per build
+# stage, VERBOSE also every derivation
+QUIET, SUMMARY, VERBOSE = 0, 1, 2
+verbosity = SUMMARY
+
+def log(message, level=SUMMARY):
+    if verbosity >= level:
+        print(message)
+
+# Rule calls made by extend_history in this process, and how many of them
+# the trigger checks skipped
+prefilter_counts = Counter()
+
+# A RuleProfile while --profile-rules is on; record_changes reads it once
+# per word, and only tests it for each rule when it is off
+rule_profile = None
+
+def extend_history(history, start, max_year=None):
+    """Apply the rules numbered `start` to `max_year` to the last form in
+    `history`, appending a step for each change. Returns `history`."""
+    end = len(sound_changes) if max_year is None else bisect_right(rule_numbers, max_year)
+    record_changes(history, Word(unmark_stress(history[-1][1])),
+                   islice(sound_changes, bisect_left(rule_numbers, start), end))
+    return history
+
+def record_changes(history, word, changes):
+    """Apply `changes` to `word`, appending a step to `history` for each
+    change. Returns the resulting Word."""
+    profile = rule_profile
+    # Rules that leave the form unchanged keep the same Word, and with it
+    # the cached syllables and stress
+    calls = skipped = 0
+    for change in changes:
+        calls += 1
+        if profile is not None:
+            start = perf_counter()
+        skip = change.trigger is not None and not change.trigger(word)
+        result = word if skip else change.apply(word)
+        skipped += skip
+        changed = unmark_stress(result) if stress_mark in result else result
+        if profile is not None:
+            profile.add(change, perf_counter() - start, skip, changed != word)
+        if changed != history[-1][1]:
+            history.append((change.rule, result))
+        if changed != word:
+            word = Word(changed)
+    prefilter_counts['calls'] += calls
+    prefilter_counts['skipped'] += skipped
     return word
 
-def glide_epenthesis_after_unstressed_u(word):
-    word = re.sub(fr'(?<!ˈ)u([{vowels}])', r'uw\1', word)
-    return word
 
-def epenthesis_initial_n_sh_z(word):
-    word = re.sub(r'^nʃ', 'anʃ', word)
-    word = re.sub(r'^nʒ', 'anʒ', word)
+class RuleProfile:
+    """Per-rule calls, time, and how many calls changed the word, were
+    skipped by the trigger check, or left the word as it was."""
+    __slots__ = ('stats', 'indices')
+
+    def __init__(self):
+        # sound_changes index -> [calls, changed, skipped, seconds]
+        self.stats = [[0, 0, 0, 0.0] for _ in sound_changes]
+        self.indices = {id(change): index for index, change in enumerate(sound_changes)}
+
+    def add(self, change, seconds, skipped, changed):
+        """Count one call of `change`, as timed by record_changes."""
+        stats = self.stats[self.indices[id(change)]]
+        stats[0] += 1
+        stats[1] += changed
+        stats[2] += skipped
+        stats[3] += seconds
+
+    def rows(self):
+        """One dict per rule, slowest first."""
+        rows = []
+        for index, (change, (calls, changed, skipped, seconds)) in enumerate(zip(sound_changes, self.stats)):
+            rows.append({'index': index, 'rule': change.rule, 'description': change.description,
+                         'calls': calls, 'changed': changed, 'unchanged': calls - changed,
+                         'skipped': skipped, 'seconds': seconds})
+        return sorted(rows, key=lambda row: row['seconds'], reverse=True)
+
+    def never_fired(self):
+        """Rules that changed no word, including those no word reached."""
+        return [row for row in self.rows() if not row['changed']]
+
+    def report(self):
+        lines = [f'{"Rule":>6}  {"Calls":>7}  {"Changed":>7}  {"No-op":>7}  {"Skipped":>7}  {"ms":>8}  Description']
+        for row in self.rows():
+            lines.append(f'{row["rule"]:>6}  {row["calls"]:>7}  {row["changed"]:>7}  {row["unchanged"]:>7}  '
+                         f'{row["skipped"]:>7}  {row["seconds"] * 1000:>8.2f}  {row["description"]}')
+        never = self.never_fired()
+        if never:
+            lines.append('Never changed a word: ' + ', '.join(f'{row["rule"]} ({row["description"]})' for row in never))
+        return '\n'.join(lines)
+
+    def save(self, filename):
+        with open(filename, 'w', encoding='utf-8') as file:
+            json.dump({'rules': self.rows(), 'never_fired': [row['index'] for row in self.never_fired()]},
+                      file, indent=2, ensure_ascii=False)
+
+def apply_sound_changes_batch(tasks):
+    """Rule-major equivalent of [apply_sound_changes(*task) for task in tasks].
+
+    Walks the cascade once. Each rule runs over the column of words it
+    covers: words join at the first rule numbered at or after their year
+    and leave after their max year. Literal rules run as one str.replace
+    over the column joined with newlines.
+    """
+    results = [None] * len(tasks)
+    histories = {}
+    forms = {}
+    waiting = []
+    for i, (year_and_word, max_year) in enumerate(tasks):
+        year, word = year_and_word[0], year_and_word[1]
+        if year == -1:
+            results[i] = apply_sound_changes(year_and_word, max_year)
+        else:
+            histories[i] = [(year, word)]
+            waiting.append(i)
+    waiting.sort(key=lambda i: tasks[i][0][0], reverse=True)
+    live = []
+    for change in sound_changes:
+        while waiting and tasks[waiting[-1]][0][0] <= change.rule:
+            i = waiting.pop()
+            forms[i] = Word(unmark_stress(histories[i][-1][1]))
+            live.append(i)
+        live = [i for i in live if tasks[i][1] is None or change.rule <= tasks[i][1]]
+        if not live:
+            continue
+        if change.literal:
+            column = '\n'.join([forms[i] for i in live])
+            changed_column = change.apply(column)
+            # an unchanged column still records a step for words whose last
+            # step kept a stress mark, as extend_history does
+            if changed_column == column and all(histories[i][-1][1] == forms[i] for i in live):
+                continue
+            column_results = changed_column.split('\n')
+        elif change.trigger is not None:
+            column_results = [change.apply(forms[i]) if change.trigger(forms[i]) else forms[i] for i in live]
+        else:
+            column_results = [change.apply(forms[i]) for i in live]
+        for i, result in zip(live, column_results):
+            history = histories[i]
+            changed = unmark_stress(result) if stress_mark in result else result
+            if changed != history[-1][1]:
+                history.append((change.rule, result))
+            if changed != forms[i]:
+                forms[i] = Word(changed)
+    for i, history in histories.items():
+        results[i] = add_plural_marker(history[-1][1], tasks[i][0][4]), history
+    return results
+
+def add_plural_marker(word, pos):
+    if pos == 'Ns' or pos == 'Ps':
+        # add plural marker
+        if not word.endswith(plural_marker):
+            word += plural_marker
     return word
 
-# List of sound changes
-sound_changes = [
-    {'rule': 1000, 'description': 'Vowel loss between voiceless consonants in unstressed syllables', 'function': vowel_loss_between_voiceless_consonants_unless_stressed},
-    {'rule': 2000, 'description': 'Voiceless stop between voiced sounds become voiced', 'function': voiceless_stop_to_voiced_between_voiced},
-    {'rule': 2100, 'description': 'Vowel loss before affricate', 'function': vowel_loss_before_approximate},
-    {'rule': 2200, 'description': 'Velar hardening k > k', 'function': velar_hardening},
-    {'rule': 2201, 'description': 'Glide epenthesis after unstressed i', 'function': glide_epenthesis_after_unstressed_i},
-    {'rule': 2202, 'description': 'Glide epenthesis after unstressed u', 'function': glide_epenthesis_after_unstressed_u},
-    {'rule': 2300, 'description': 'ə lost', 'function': schwa_deletion},
-    {'rule': 3000, 'description': 'No voiceless stops in clusters', 'function': no_voiceless_stops_in_clusters},
-    {'rule': 3200, 'description': 'Medial vowel loss', 'function': medial_vowel_loss}, # huge change
-    {'rule': 3201, 'description': 'Unstressed ie to e', 'function': unstressed_ie_to_e},
-    {'rule': 3202, 'description': 'Stressed ie to long i', 'function': stressed_ie_to_long_i},
-    {'rule': 3500, 'description': 'ɟ to j', 'function': change_bardotlessj},
-    {'rule': 3501, 'description': 'Rhotacism GsG > GrG and GʒG > GrG', 'function': rhotacism_between_glides},
-    {'rule': 3502, 'description': 'Rhotacism VsV > VrV to VʒV > VrV', 'function': rhotacism_between_vowels},
-    {'rule': 3503, 'description': 'Nasal assimilation mth > nth', 'function': nasal_assimilation_mθ_to_nθ},
-    {'rule': 3503, 'description': 'epenthesize_initial_nθ', 'function': epenthesize_initial_nθ},
-    {'rule': 4500, 'description': 'No stops after fricatives', 'function': no_stops_after_fricatives},
-    {'rule': 4501, 'description': 'No stops after liquids', 'function': no_stops_after_liquids},
-    {'rule': 4502, 'description': 'No fricative clusters', 'function': no_fricative_clusters},
-    {'rule': 4503, 'description': 'No stops after glides', 'function': no_stops_after_glides},
-    {'rule': 5000, 'description': 'h is lost between vowels and at the end of words', 'function': loss_of_h},
-    {'rule': 5100, 'description': 's is lost between vowels', 'function': loss_of_s_between_vowels},
-    {'rule': 5500, 'description': 'Vowel combinations', 'function': vowel_combinations},
-    {'rule': 6000, 'description': 'Nasal assimilation', 'function': nasal_assimilation},
-    {'rule': 6200, 'description': 'Approximate loss after o or u', 'function': approximate_loss_after_o_or_u},
-    {'rule': 6240, 'description': 'hn > n', 'function': simplify_hn_to_n},
-    {'rule': 6300, 'description': 'Vowel loss before approximates', 'function': vowel_loss_before_approximate},
-    {'rule': 6400, 'description': 'Nasal deletion before voiceless obstruents', 'function': nasal_deletion_before_voiceless_obstruents}, 
-    {'rule': 6401, 'description': 'tl → ƛ', 'function': simplify_tl_to_ƛ},
-    {'rule': 6402, 'description': 'lh → ɬ', 'function': simplify_lh_to_ɬ},
-    {'rule': 6500, 'description': 'No double consonants', 'function': no_double_consonants},
-    {'rule': 6501, 'description': 'Simplify initial ƛn cluster', 'function': simplify_initial_tl_n_cluster},
-    {'rule': 6502, 'description': 'Epenthesis in initial fm', 'function': epenthesis_in_initial_fm},
-    {'rule': 6503, 'description': 'Metathesize lr', 'function': metathesize_lr},
-    {'rule': 7400, 'description': 'Epenthesis in initial lm', 'function': epenthesis_in_initial_lm},
-    {'rule': 7500, 'description': 'Word-initial vowel loss', 'function': word_initial_vowel_loss_unless_stressed},
-    {'rule': 7501, 'description': 'f to ɸ at the end of words', 'function': f_to_phi_at_word_end},
-    {'rule': 7501, 'description': 'Onset cluster simplification', 'function': onset_cluster_simplification},
-    {'rule': 7502, 'description': 'Epenthesis in initial ml', 'function': epenthesis_in_initial_ml},
-    {'rule': 7503, 'description': 'Metathesize jf', 'function': metathesize_jf},
-    {'rule': 7600, 'description': 'Simplify sonorant clusters', 'function': simplify_sonorant_clusters_excluding_initial_mr},
-    {'rule': 8000, 'description': 'θr unless stressed', 'function': theta_r},
-    {'rule': 8500, 'description': 'No stops after nasals', 'function': no_stops_after_nasals_except_when_split_syllable},
-    {'rule': 8750, 'description': 'No stops after any sonorant', 'function': no_stops_after_sonorants},
-    {'rule': 8760, 'description': 'epenthesis_initial_n_sh_z', 'function': epenthesis_initial_n_sh_z},
-    {'rule': 9200, 'description': 'Reduplicant vowel reduction', 'function': reduplicant_vowel_reduction}, # big change
-    {'rule': 9300, 'description': 'Epenthesis in ƛd clusters', 'function': epenthesis_in_ƛd_cluster},
-    {'rule': 9500, 'description': 'Word-final vowel loss', 'function': word_final_vowel_loss_unless_stressed},
-    {'rule': 10000, 'description': 'ae to a', 'function': ae_to_a},
-    {'rule': 10500, 'description': 'θ to s before k', 'function': theta_s_before_k},
-    {'rule': 10700, 'description': 'θ to t after voiceless stops', 'function': theta_t_after_voiceless_stops},
-    {'rule': 11000, 'description': 'No coda stops', 'function': p_b_to_m},
-    {'rule': 11001, 'description': 'b to d', 'function': b_to_d},
-    {'rule': 11500, 'description': 'Stop cluster simplification', 'function': stop_cluster_simplification},
-    {'rule': 11501, 'description': 'Simplify gƛ', 'function': simplify_g_tl},
-    {'rule': 11600, 'description': 'Medial syncope', 'function': medial_syncope_unless_stressed},
-    {'rule': 11990, 'description': 'ə lost', 'function': schwa_deletion},
-    {'rule': 11995, 'description': 'Simplify initial mf to m', 'function': simplify_initial_mf_to_m},
-    {'rule': 11996, 'description': 'Epenthetic vowel in initial double nasal', 'function': epenthetic_vowel_in_initial_double_nasal},
-    {'rule': 12000, 'description': 'z to s', 'function': z_to_s},
-    {'rule': 12001, 'description': 'ʒ to ʃ', 'function': y_to_sh},
-    {'rule': 12002, 'description': 'ð to θ', 'function': unvoice_th},
-    {'rule': 12003, 'description': 'Light morpheme simplification', 'function': light_morpheme_simplification},
-    {'rule': 12004, 'description': 'Reduplication simplification', 'function': reduplication_simplification},
-    {'rule': 12005, 'description': 'No repeated vowels', 'function': no_repeated_vowels},
-    {'rule': 12006, 'description': 'No word-final e', 'function': no_final_e},
-    {'rule': 12007, 'description': 'No repeated consonants', 'function': no_double_consonants},
-    {'rule': 12400, 'description': 'Epenthetic vowel in initial tʃ', 'function': epenthesis_in_initial_t_sh_cluster},
-    {'rule': 12500, 'description': 'Simplify fricative-liquid clusters', 'function': simplify_fricative_liquid_clusters},
-    {'rule': 12501, 'description': 'Dissimilate fricative reduplication', 'function': dissimilate_fricative_reduplication},
-    {'rule': 12502, 'description': 'Simplify lθ → l', 'function': simplify_lθ_to_θ},
-    {'rule': 12503, 'description': 'Simplify dg → g', 'function': simplify_dg_cluster},
-    {'rule': 13000, 'description': 'No fricative clusters', 'function': no_fricative_clusters},
-    {'rule': 13001, 'description': 'Simplify final consonant clusters to single consonant', 'function': simplify_final_clusters},
-    {'rule': 13002, 'description': 'Simplify fricative-nasal clusters', 'function': simplify_fricative_nasal_clusters},
-    {'rule': 13003, 'description': 'wiw to win', 'function': wiw_to_win},
-    {'rule': 13004, 'description': 'Simplify stop sonorany clusters word finally', 'function': simplify_final_stop_sonorant_clusters},
-    {'rule': 14000, 'description': 'No fricatives after affricates', 'function': no_fricatives_after_affricates},
-    {'rule': 14001, 'description': 'No affricates after fricatives', 'function': no_affricates_after_fricatives},
-    {'rule': 14005, 'description': 'Epenthesis and metathesis /ʃd/ → [ɬt]', 'function': shd_to_lht},
-    {'rule': 14006, 'description': 'Voiceless glottal fricative h to pharyngeal fricative ħ', 'function': h_to_ħ},
-    {'rule': 15000, 'description': 'No repeated consonants', 'function': no_double_consonants},
-]
-
 # Function to apply all sound changes
-def apply_sound_changes(year_and_word, max_year=None):
+def apply_sound_changes(year_and_word, max_year=None, checkpoint=None):
+    """Derive a word, or with `checkpoint` = (history, start) continue an
+    earlier derivation from the rule numbered `start`."""
     year, word, _, _, pos, _ = year_and_word
-    history = [(year, word)]
     if year == -1:
         # skip sound changes for permanent words (proper nouns and markers)
         return word, [(0, word)]
-    for change in sound_changes:
-        if change['rule'] < year:
-            continue
-        if max_year is not None and change['rule'] > max_year:
-            break
-        
-        word = change['function'](unmark_stress(word))
-        if unmark_stress(word) != history[-1][1]:
-            history.append((change['rule'], word))
-    word = history[-1][1]
+    if checkpoint is None:
+        history = extend_history([(year, word)], year, max_year)
+    else:
+        history, start = checkpoint
+        history = extend_history(list(history), max(year, start), max_year)
+    return add_plural_marker(history[-1][1], pos), history
+
+def snapshot(year_and_word, history, max_year):
+    """Slice a full derivation down to what apply_sound_changes would return
+    with `max_year`, as (word, history)."""
+    if max_year is not None:
+        end = 1
+        while end < len(history) and history[end][0] <= max_year:
+            end += 1
+        history = history[:end]
+    if year_and_word[0] == -1:
+        return history[-1][1], history
+    return add_plural_marker(history[-1][1], year_and_word[4]), history
+
+class HistoryStore:
+    """Derivation histories packed into flat buffers: the sound_changes
+    index of each step's rule (the first step of each entry, numbered by
+    its start year instead, keeps that year in `years`), the UTF-8 forms
+    back to back in one bytearray, and the offsets between them. store[i]
+    is a StoredHistory that only decodes a step when it is read.
+    """
+    __slots__ = ('rules', 'years', 'ends', 'forms', 'starts')
+
+    # `rules` value of the first step of an entry
+    START = 0xFFFF
+
+    def __init__(self, histories=()):
+        if len(sound_changes) >= self.START:
+            raise ValueError(f'{len(sound_changes)} rules do not fit in a HistoryStore')
+        self.rules = array('H')
+        self.years = array('q')
+        # end of each step's form in `forms`
+        self.ends = array('q')
+        self.forms = bytearray()
+        # first step of each entry, plus the end of the last one
+        self.starts = array('q', [0])
+        for history in histories:
+            self.append(history)
+
+    def append(self, history):
+        for rule, form in history:
+            if len(self.rules) == self.starts[-1]:
+                self.years.append(rule)
+                self.rules.append(self.START)
+            else:
+                # rules that share a number are told apart by nothing else
+                # in a history, so the first index of the number will do
+                self.rules.append(bisect_left(rule_numbers, rule))
+            self.forms += form.encode('utf-8')
+            self.ends.append(len(self.forms))
+        self.starts.append(len(self.rules))
+
+    def step(self, i):
+        start = self.ends[i - 1] if i else 0
+        rule = self.rules[i]
+        rule = self.years[bisect_right(self.starts, i) - 1] if rule == self.START else rule_numbers[rule]
+        return rule, self.forms[start:self.ends[i]].decode('utf-8')
+
+    def __len__(self):
+        return len(self.starts) - 1
+
+    def __getitem__(self, index):
+        index = range(len(self))[index]
+        return StoredHistory(self, self.starts[index], self.starts[index + 1])
+
+    def __iter__(self):
+        return map(self.__getitem__, range(len(self)))
+
+class StoredHistory:
+    """Read-only view of one entry of a HistoryStore that can stand in for
+    its list of (rule, form) steps."""
+    __slots__ = ('store', 'start', 'stop')
+
+    def __init__(self, store, start, stop):
+        self.store = store
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            steps = range(self.start, self.stop)[index]
+            if steps.step != 1:
+                return [self.store.step(i) for i in steps]
+            return StoredHistory(self.store, steps.start, max(steps.start, steps.stop))
+        return self.store.step(range(self.start, self.stop)[index])
+
+    def __iter__(self):
+        return map(self.store.step, range(self.start, self.stop))
+
+# Compiled cascade: stages that skip the words their rules cannot change. On
+# the way to a final form alone (the components of compounds) runs of literal
+# rules also run as one composed stage; a history replays them rule by rule.
+
+class Stage:
+    """Consecutive sound_changes[start:end] run as one step. Runs of literal
+    rules are composed into one list of operations, where single-segment
+    replacements merge into translate tables; any other rule is a stage of
+    its own, and function rules run as `function`. `trigger` is False for a
+    Word no rule in the stage can change, or None if it has to run."""
+    __slots__ = ('start', 'end', 'trigger', 'operations', 'function')
+
+    def __init__(self, start, end):
+        changes = sound_changes[start:end]
+        self.start = start
+        self.end = end
+        self.function = changes[0].function if changes[0].steps is None else None
+        self.operations = compose_steps(chain.from_iterable(change.steps for change in changes)) if self.function is None else None
+        if changes[0].literal:
+            # a literal stage changes nothing unless one of its patterns occurs
+            patterns = [operation for operation, replacement in self.operations if replacement is not None]
+            patterns += [chr(segment) for operation, replacement in self.operations if replacement is None for segment in operation]
+            search = re.compile('|'.join(map(re.escape, patterns))).search if patterns else None
+            self.trigger = (lambda word: search(word) is not None) if search else (lambda word: False)
+        elif len(changes) == 1:
+            self.trigger = changes[0].trigger
+        elif all(change.trigger is not None for change in changes):
+            needs = sum_masks(change.trigger.needs for change in changes)
+            self.trigger = lambda word: word.segments & needs != 0
+        else:
+            self.trigger = None
+
+    def apply(self, word):
+        if self.function is not None:
+            return self.function(word)
+        for operation, replacement in self.operations:
+            if replacement is None:
+                word = word.translate(operation)
+            elif isinstance(operation, str):
+                word = word.replace(operation, replacement)
+            else:
+                word = operation.sub(replacement, word)
+        return word
 
-    if pos == 'Ns' or pos == 'Ps':
-        # add plural marker
-        if not word.endswith(plural_marker):
-            word += plural_marker
+def compose_steps(steps):
+    """Turn Rewrite steps into (operation, replacement) pairs, composing
+    consecutive single-segment replacements into one translate table
+    (with replacement None) and dropping literal steps that change nothing."""
+    operations = []
+    table = None
+    for pattern, replacement in steps:
+        if isinstance(pattern, str) and pattern == replacement:
+            continue
+        if isinstance(pattern, str) and len(pattern) == 1:
+            if table is None:
+                table = {}
+                operations.append(table)
+            for segment in table:
+                table[segment] = table[segment].replace(pattern, replacement)
+            table.setdefault(pattern, replacement)
+        else:
+            table = None
+            operations.append((pattern, replacement))
+    return tuple((str.maketrans(op), None) if isinstance(op, dict) else op for op in operations)
+
+@lru_cache(maxsize=None)
+def compile_cascade(start, end):
+    """Stages covering sound_changes[start:end]."""
+    stages = []
+    while start < end:
+        stop = start + 1
+        if sound_changes[start].literal:
+            while stop < end and sound_changes[stop].literal:
+                stop += 1
+        stages.append(Stage(start, stop))
+        start = stop
+    return tuple(stages)
+
+def run_compiled(year_and_word, max_year=None, history=None):
+    """Derive the last history form of a word through compile_cascade.
+
+    With `history` (a list holding the input step), also append the steps
+    apply_sound_changes records: a single-rule stage records its own
+    result, and a composed stage the word enters is replayed rule by rule,
+    since its rules may change the word and change it back."""
+    year, word = year_and_word[0], year_and_word[1]
+    end = len(sound_changes) if max_year is None else bisect_right(rule_numbers, max_year)
+    # `last` follows history[-1][1]: while it differs from the word (it
+    # still has stress marks), the next rule records a step even if it
+    # changes nothing, so that stage cannot be skipped
+    last = word
+    word = Word(unmark_stress(word))
+    for stage in compile_cascade(bisect_left(rule_numbers, year), end):
+        if last == word and stage.trigger is not None and not stage.trigger(word):
+            continue
+        if history is not None and stage.end - stage.start > 1:
+            word = record_changes(history, word, islice(sound_changes, stage.start, stage.end))
+            last = history[-1][1]
+            continue
+        result = stage.apply(word)
+        changed = unmark_stress(result) if stress_mark in result else result
+        if changed != last:
+            last = result
+            if history is not None:
+                history.append((sound_changes[stage.start].rule, result))
+        if changed != word:
+            word = Word(changed)
+    return last
+
+def apply_sound_changes_compiled(year_and_word, max_year=None):
+    """Equivalent of apply_sound_changes(year_and_word, max_year)."""
+    if year_and_word[0] == -1:
+        return apply_sound_changes(year_and_word, max_year)
+    history = [(year_and_word[0], year_and_word[1])]
+    run_compiled(year_and_word, max_year, history)
+    return add_plural_marker(history[-1][1], year_and_word[4]), history
+
+
+class DerivationCache:
+    """Memoizes apply_sound_changes by (entry, cutoff year) for one build.
+
+    A cutoff that has not been derived yet resumes from the entry's nearest
+    earlier cutoff instead of starting again from the proto-form. With
+    `compiled`, only the last form is derived, by run_compiled, and the
+    history returned is None.
+    """
+    __slots__ = ('compiled', 'histories', 'hits', 'resumed', 'misses')
+
+    def __init__(self, compiled=False):
+        self.compiled = compiled
+        self.histories = {}
+        self.hits = 0
+        self.resumed = 0
+        self.misses = 0
+
+    def apply_sound_changes(self, year_and_word, max_year):
+        year, word, _, _, pos, _ = year_and_word
+        if year == -1:
+            return apply_sound_changes(year_and_word, max_year)
+        checkpoints = self.histories.setdefault(year_and_word, {})
+        history = checkpoints.get(max_year)
+        if history is not None:
+            self.hits += 1
+        else:
+            # a None cutoff runs the whole cascade, so it is the latest one
+            earlier = [cutoff for cutoff in checkpoints
+                       if cutoff is not None and (max_year is None or cutoff < max_year)]
+            if earlier:
+                self.resumed += 1
+                nearest = max(earlier)
+                start, history = max(year, nearest + 1), checkpoints[nearest]
+            else:
+                self.misses += 1
+                start, history = year, None
+            if self.compiled:
+                # the checkpoints are last history forms
+                history = run_compiled((start, word if history is None else history), max_year)
+            else:
+                history = extend_history([(year, word)] if history is None else list(history), start, max_year)
+            checkpoints[max_year] = history
+        if self.compiled:
+            return add_plural_marker(history, pos), None
+        return add_plural_marker(history[-1][1], pos), history
+
+    def report(self):
+        lookups = self.hits + self.resumed + self.misses
+        rate = self.hits / lookups if lookups else 0
+        return (f'Derivation cache: {lookups} lookups, {self.hits} hits, '
+                f'{self.resumed} resumed, {self.misses} misses ({rate:.0%} hit rate)')
+
+def referenced_globals(obj):
+    """Module-level names used by a function or by the methods of a class,
+    including inside nested lambdas and comprehensions."""
+    if inspect.isclass(obj):
+        members = [getattr(m, 'func', getattr(m, 'fget', m)) for m in vars(obj).values()]
+        codes = [m.__code__ for m in members if inspect.isfunction(m)]
+    else:
+        codes = [obj.__code__]
+    names = []
+    while codes:
+        code = codes.pop()
+        names.extend(code.co_names)
+        codes.extend(const for const in code.co_consts if inspect.iscode(const))
+    return [globals()[name] for name in names if name in globals()]
+
+@lru_cache(maxsize=None)
+def source_of(obj):
+    return inspect.getsource(obj)
+
+def fingerprint(*objects, exclude=()):
+    """Hash the source of `objects` and of every function, class and constant
+    of this module they refer to, directly or through each other, except
+    for the objects in `exclude`."""
+    digest = hashlib.sha256()
+    pending = list(reversed(objects))
+    seen = {id(obj) for obj in exclude}
+    while pending:
+        obj = pending.pop()
+        if isinstance(obj, re.Pattern):
+            # repr() of a pattern cuts it off after 200 characters
+            digest.update(repr((obj.pattern, obj.flags)).encode('utf-8'))
+            continue
+        if isinstance(obj, (str, int)):
+            digest.update(repr(obj).encode('utf-8'))
+            continue
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+        if isinstance(obj, (list, tuple)):
+            pending.extend(reversed(obj))
+        elif isinstance(obj, dict):
+            pending.extend(reversed(list(obj.items())))
+        elif isinstance(obj, (Rewrite, SoundChange)):
+            # underscored slots are caches, not part of the rule
+            pending.extend(reversed([type(obj)] + [getattr(obj, slot) for slot in obj.__slots__ if not slot.startswith('_')]))
+        elif (inspect.isfunction(obj) or inspect.isclass(obj)) and obj.__module__ == __name__:
+            digest.update(source_of(obj).encode('utf-8'))
+            pending.extend(reversed(referenced_globals(obj)))
+    return digest.hexdigest()
+
+
+def cascade_fingerprints():
+    """Fingerprints of the rule loops themselves and of each rule in order."""
+    # every engine writes to the same cache, so a fix to any of them
+    # invalidates the entries it may have made. log() (and with it
+    # --verbose) and the counters of the run do not change any form.
+    state = (log, prefilter_counts, unsyllabified)
+    engine = fingerprint(apply_sound_changes, apply_sound_changes_batch, apply_sound_changes_compiled,
+                         exclude=(sound_changes, rule_numbers) + state)
+    return engine, [[change.rule, fingerprint(change, exclude=state)] for change in sound_changes]
+
+def unchanged_rules(old, new):
+    """Number of leading rules two cascades share, backed up so the split
+    does not fall between two rules with the same number."""
+    shared = 0
+    while shared < min(len(old), len(new)) and old[shared] == new[shared]:
+        shared += 1
+    if shared == len(old) == len(new):
+        return shared
+    def splits_group(rules):
+        return 0 < shared < len(rules) and rules[shared - 1][0] == rules[shared][0]
+    while splits_group(old) or splits_group(new):
+        shared -= 1
+    return shared
+
+
+class BuildCache:
+    """Derivations from earlier builds, kept in `directory`/derivations.json.
+
+    Entries are keyed by their (entry, max year) task. The file also records
+    a fingerprint of each rule, so after editing the cascade a word's stored
+    history, cut off before the first changed rule, is a checkpoint to
+    resume from. Editing the rule loop itself invalidates everything.
+    Entries that a build does not look up are dropped when it saves.
+    """
+    __slots__ = ('path', 'engine', 'rules', 'entries', 'used', 'resume_after',
+                 'hits', 'resumed', 'misses')
+
+    def __init__(self, directory):
+        self.path = os.path.join(directory, 'derivations.json')
+        self.engine, self.rules = cascade_fingerprints()
+        self.entries = {}
+        self.used = {}
+        self.hits = 0
+        self.resumed = 0
+        self.misses = 0
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                stored = json.load(file)
+        except FileNotFoundError:
+            stored = None
+        except ValueError:
+            print(f'Ignoring unreadable cache {self.path}')
+            stored = None
+        # None: every stored history is complete; 0: nothing can be reused;
+        # otherwise the last rule number whose steps are still valid
+        self.resume_after = None
+        if stored is not None and stored.get('engine') == self.engine:
+            self.entries = stored['entries']
+            shared = unchanged_rules(stored['rules'], self.rules)
+            if shared < max(len(stored['rules']), len(self.rules)):
+                self.resume_after = self.rules[shared - 1][0] if shared else 0
+
+    def key(self, year_and_word, max_year):
+        text = json.dumps([year_and_word, max_year], ensure_ascii=False)
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Return (hit, checkpoint): whether result(key) holds a valid cached
+        result, else a checkpoint for apply_sound_changes if there is one."""
+        record = self.entries.get(key)
+        if record is None or self.resume_after == 0:
+            self.misses += 1
+            return False, None
+        if self.resume_after is None:
+            self.hits += 1
+            self.used[key] = record
+            return True, None
+        self.resumed += 1
+        word, history = json.loads(record) if isinstance(record, str) else record
+        history = [tuple(step) for step in history]
+        # history[0] is the input word, later steps are numbered by rule
+        valid = history[:1] + [step for step in history[1:] if step[0] <= self.resume_after]
+        return False, (valid, self.resume_after + 1)
+
+    def result(self, key):
+        """The (word, history) of a hit, converted when it is asked for."""
+        record = self.used[key]
+        word, history = json.loads(record) if isinstance(record, str) else record
+        return word, [tuple(step) for step in history]
+
+    def put(self, key, derived):
+        # as JSON text, which takes far less memory than the steps
+        self.used[key] = json.dumps(derived, ensure_ascii=False)
+
+    def begin(self):
+        """Count and collect the entries of a new build on this cache, as
+        when `serve` reloads the lexicon."""
+        self.used = {}
+        self.hits = 0
+        self.resumed = 0
+        self.misses = 0
+
+    def save(self):
+        """Write the entries this build used. They are what the next build
+        on this cache finds, and every one of them is complete."""
+        if self.resume_after is not None or self.used != self.entries:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            temp = self.path + '.tmp'
+            with open(temp, 'w', encoding='utf-8') as file:
+                header = json.dumps({'engine': self.engine, 'rules': self.rules}, ensure_ascii=False)
+                file.write(header[:-1] + ', "entries": {')
+                for i, (key, record) in enumerate(self.used.items()):
+                    if not isinstance(record, str):
+                        record = json.dumps(record, ensure_ascii=False)
+                    file.write(f'{", " if i else ""}"{key}": {record}')
+                file.write('}}')
+            os.replace(temp, self.path)
+        self.entries = self.used
+        self.used = {}
+        self.resume_after = None
+
+    def report(self):
+        return f'Build cache: {self.hits} hits, {self.resumed} resumed, {self.misses} misses'
+
+
+def map_tasks(function, tasks, pool=None, jobs=1):
+    """function(*task) for each task, in task order, in `pool` if given."""
+    if pool is None or not tasks:
+        return (function(*task) for task in tasks)
+    # map() yields in input order, so the outputs match a serial run
+    return pool.map(function, *zip(*tasks), chunksize=chunk_size(len(tasks), jobs))
+
+def derive(tasks, derive_one, pool=None, jobs=1, cache=None, batch=False):
+    """Run derive_one(year_and_word, max_year) over (year_and_word, max_year)
+    tasks and yield the results in task order as they come, so the caller
+    need not hold every history at once. Tasks in the build cache are not
+    derived again, or resume from their checkpoint; the others go to `pool`
+    when there is one. With `batch`, fresh tasks are derived with
+    apply_sound_changes_batch instead of derive_one."""
+    keys = [cache.key(*task) for task in tasks] if cache is not None else None
+    # None for a fresh task, a checkpoint for a resumed one, True for a hit
+    sources = [None] * len(tasks)
+    fresh = []
+    resumed = []
+    for i in range(len(tasks)):
+        if cache is not None:
+            hit, sources[i] = cache.get(keys[i])
+            if hit:
+                sources[i] = True
+        if sources[i] is None:
+            fresh.append(i)
+        elif sources[i] is not True:
+            resumed.append(tasks[i] + (sources[i],))
+    fresh_tasks = [tasks[i] for i in fresh]
+    if not batch:
+        fresh_derived = map_tasks(derive_one, fresh_tasks, pool, jobs)
+    elif pool is None or not fresh_tasks:
+        fresh_derived = apply_sound_changes_batch(fresh_tasks)
+    else:
+        # one column per worker
+        size = -(-len(fresh_tasks) // jobs)
+        columns = [(fresh_tasks[start:start + size],) for start in range(0, len(fresh_tasks), size)]
+        fresh_derived = chain.from_iterable(map_tasks(apply_sound_changes_batch, columns, pool))
+    fresh_derived = iter(fresh_derived)
+    resumed_derived = iter(map_tasks(apply_sound_changes, resumed, pool, jobs))
+    for i, source in enumerate(sources):
+        if source is True:
+            yield cache.result(keys[i])
+            continue
+        result = next(fresh_derived if source is None else resumed_derived)
+        if cache is not None:
+            cache.put(keys[i], result)
+        yield result
 
-    return word, history
+def chunk_size(count, jobs):
+    # a few chunks per worker keeps them busy without much pickling overhead
+    return max(1, count // (jobs * 4))
 
 # Function to format the final word for LaTeX
 def format_for_latex(word):
-    word_chars = list(word)
-    replacements = {
-        'ʃ': r'{\textesh}',
-        'ŋ': r'{\ng}',
-        'θ': r'{\texttheta}',
-        'ð': r'{\dh}',
-        'ɟ': r'{\textbardotlessj}',
-        'ɬ': r'{\textbeltl}',
-        'ʒ': r'{\textyogh}',
-        'ƛ': r'{\texttoptiebar{t\textbeltl}}',
-        'ə': r'{\textschwa}',
-        'ˈ': r'{\textprimstress}',
-        'j': r'y',
-        'ɸ': r'{\textphi}',
-        't': r'{\textsubbridge{t}}',
-        ':': r'{\textlengthmark}',
-    }
-
-    for ipa_char, latex_char in replacements.items():
-        for i, char in enumerate(word_chars):
-            if char == ipa_char:
-                word_chars[i] = latex_char
-    return ''.join(word_chars)
+    # str() so the memo does not keep Word objects and their cached syllables
+    return transliterate(str(word), 'latex')
 
 def borrowed_sound_changes(borrowed):
     always_replaced = {
@@ -730,94 +1445,87 @@ def borrowed_sound_changes(borrowed):
     for b in borrowed:
         word = b[1]
         for s,r in always_replaced.items():
-            word = word.replace(s,r)
-            print(b[1], word,s,r)
+            if s in word:
+                word = word.replace(s,r)
+                log(f'{b[1]} {word} {s} {r}', VERBOSE)
         borrowed_replaced.append((b[0],word,b[2],b[3],b[4],b[-1]))
     return borrowed_replaced
 
 def romanization(word):
-    replacements = {
-        'ʃ': r'sh',
-        'ŋ': r'ng',
-        'θ': r'th',
-        'ð': r'dh',
-        'ɟ': r'j',
-        'ɬ': r'lh',
-        'ʒ': r'z',
-        'j': r'y',
-        'ƛ': r'tl',
-        'ə': r'e',
-        'ɸ': r'f',
-        'ħ': r'h',
-        'ˈ': r'\'',
-        ':': r':',
-    }
-    for roman_char, latex_char in replacements.items():
-        word = word.replace(roman_char, latex_char)
-    return word
+    return transliterate(str(word), 'romanization')
+
+class DictionaryEntry:
+    """One row of dictionary.csv. `synonyms` holds every definition of the
+    word the row came from, or None if it has only one."""
+    __slots__ = ('english', 'tovian', 'ipa', 'pos', 'roots', 'synonyms')
+
+    def __init__(self, english, tovian, ipa, pos, roots, synonyms=None):
+        self.english = english
+        self.tovian = tovian
+        self.ipa = ipa
+        self.pos = pos
+        self.roots = roots
+        self.synonyms = synonyms
+
+    def row(self):
+        return [self.english, self.tovian, self.ipa, self.roots]
+
+    def sort_key(self):
+        # numbers at the end of the list, grammatical markers just before them
+        identical = '_' if self.synonyms is None else ' / '.join(self.synonyms)
+        key = ','.join([self.english, self.tovian, self.ipa, self.pos, self.roots, identical]).lower()
+        if self.pos in ['CASE', 'CLASS', 'PLURAL', 'MOOD', 'VOICE', 'ASPECT', 'PLACEHOLDER']:
+            return 'zzz' + key
+        if not key[0].isdigit():
+            return key
+        else:
+            return 'zzzz' + key
 
-def get_dictionary_csv(word_after_changes, translation, stress, rom, pos, notes, roots):
+def get_dictionary_entry(word_after_changes, translation, rom, pos, roots):
     # Create a display IPA with syllable dots, but do not use dots in sound changes.
     display_ipa = dotted_with_stress(unmark_stress(word_after_changes))
-    csv_lines = []
-    csv_lines.append(f"{translation.strip()},{rom},/{display_ipa}/,{pos},{roots}")
-    return "\n".join(csv_lines)
-
-def get_dictionary_latex(history, translation,roots,pos,notes):
-    # Start tabular environment with dynamic number of columns
+    return DictionaryEntry(translation.strip(), rom, f'/{display_ipa}/', pos, roots)
 
+def iter_dictionary_latex(history, translation, roots, pos, notes):
+    """Yield the LaTeX of one dictionary entry piece by piece."""
     raw_word = history[-1][1]
+    rom = romanization(raw_word)
 
     max_rows = 1000
     # if len(raw_word) > 8:
         # max_rows = 4
 
-    text = ''
-    text += fr'\vspace{{{SPACE_BETWEEN_ENTRIES}}}' + '\n'
-    text+= r'\begin{nopagebreak}' + '\n'
-    text+=rf'\noindent{{\fontsize{{{FONT_SIZE}}}{{10pt}}\textbf{{{romanization(raw_word)}}} }} \textit{{{translation}}}' 
-    text+= f' ({pos})'
-    text+= r'\\' + '\n'
-    text+=rf'\noindent {{\tovian \fontsize{{{FONT_SIZE}}}{{10pt}} \textbf{{{romanization(raw_word)}}} }}'
-    text+= r'\\' + '\n'
-    text+=rf'\noindent /{format_for_latex(mark_stress(raw_word))}/'
-    text+= r'\\' + '\n'
+    yield fr'\vspace{{{SPACE_BETWEEN_ENTRIES}}}' + '\n'
+    yield r'\begin{nopagebreak}' + '\n'
+    yield rf'\noindent{{\fontsize{{{FONT_SIZE}}}{{10pt}}\textbf{{{rom}}} }} \textit{{{translation}}} ({pos})\\' + '\n'
+    yield rf'\noindent {{\tovian \fontsize{{{FONT_SIZE}}}{{10pt}} \textbf{{{rom}}} }}\\' + '\n'
+    yield rf'\noindent /{format_for_latex(mark_stress(raw_word))}/\\' + '\n'
     if roots!='_':
-        text+=rf'\noindent lit. {roots}'
-        text+= r'\\' + '\n'
+        yield rf'\noindent lit. {roots}\\' + '\n'
     if notes!='_':
-        text+=rf'\noindent \textit{{{notes}}}'
-        text+= r'\\' + '\n'
-    text +='\n\n'
-    text += r'\noindent History:' + '\n'
+        yield rf'\noindent \textit{{{notes}}}\\' + '\n'
+    yield '\n\n' + r'\noindent History:' + '\n'
 
     # split up into groups of 5 max
     groups = [history[i:i+max_rows] for i in range(0, len(history), max_rows)]
     for idx, group in enumerate(groups):
         num_columns = 3
-        # num_columns = max(2, num_columns)
-        column_format = ''+'c' * num_columns
-        # if idx >0:
-        text+='\n'+ r'\vspace{-0pt}' + '\n' + r'\hspace{40pt}'+ '\n'
-        text += rf'\begin{{tabular}}{{{column_format}}}' + '\n'
-        
-        this_group = group
-
-        for j, (rule, word) in enumerate(this_group):
-            text += fr'\textit{{{rule}}} & '
-            text += fr'/{format_for_latex(word)}/' 
-            if (j!=len(this_group)-1) or (idx != len(groups)-1):
-                text += r'&$\rightarrow$ & '
+        column_format = 'c' * num_columns
+        yield '\n' + r'\vspace{-0pt}' + '\n' + r'\hspace{40pt}' + '\n'
+        yield rf'\begin{{tabular}}{{{column_format}}}' + '\n'
+        for j, (rule, word) in enumerate(group):
+            yield fr'\textit{{{rule}}} & /{format_for_latex(word)}/'
+            if (j!=len(group)-1) or (idx != len(groups)-1):
+                yield r'&$\rightarrow$ & '
             else:
-                text += r'& '
-        
-        text+=r'\\'
-    
-        text += '\n'+r'\end{tabular}' + '\n\n'
-    text+=r'\vspace{20pt}\hline' + '\n\n'
-    text += r'\end{nopagebreak}' + '\n'
-    text+=r'\filbreak' + '\n\n'
-    return text
+                yield r'& '
+        yield r'\\' + '\n' + r'\end{tabular}' + '\n\n'
+    yield r'\vspace{20pt}\hline' + '\n\n'
+    yield r'\end{nopagebreak}' + '\n'
+    yield r'\filbreak' + '\n\n'
+
+def get_dictionary_latex(history, translation, roots, pos, notes):
+    return ''.join(iter_dictionary_latex(history, translation, roots, pos, notes))
 
 
 def load_roots():
@@ -847,167 +1555,704 @@ def remove_obsolete_marker(word):
     return word.replace(" (obsolete)", "")
 
 
-def find_root_or_compound(word, roots, compounds):
-    for root in roots:
-        r = remove_obsolete_marker(root[2]).strip()
-        if r == word:
-            return root
-        if word in r.split('/'):
-            # also find polysemous roots
-            return root
-    for compound in compounds:
-        c = remove_obsolete_marker(compound[2]).strip()
-        if c == word:
-            return compound
-        if word in c.split('/'):
-            # also find polysemous compounds
-            return compound
-    print(f"Could not find {word}")
-    return None
-
-def form_compounds(roots):
+def gloss_aliases(gloss):
+    gloss = remove_obsolete_marker(gloss).strip()
+    # also index polysemous entries under each alternative
+    return dict.fromkeys([gloss] + gloss.split('/'))
+
+
+class AliasIndex:
+    """Maps each gloss, and each '/' alternative in it, to its entry.
+
+    Entries are added in lookup precedence (roots, then compounds in file
+    order), so the first entry to claim an alias keeps it. Later claimants
+    are recorded in `ambiguous`; aliases that lookups actually resolved
+    through are collected in `used_ambiguous` and reported once.
+    """
+    __slots__ = ('entries', 'ambiguous', 'used_ambiguous')
+
+    def __init__(self, entries=()):
+        self.entries = {}
+        self.ambiguous = {}
+        self.used_ambiguous = {}
+        for entry in entries:
+            self.add(entry)
+
+    def add(self, entry):
+        for alias in gloss_aliases(entry[2]):
+            first = self.entries.setdefault(alias, entry)
+            if first is not entry:
+                self.ambiguous.setdefault(alias, [first]).append(entry)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def report_ambiguous(self):
+        for alias, others in self.used_ambiguous.items():
+            entry = self.entries[alias]
+            print(f"Ambiguous {alias}: using {entry[2]!r} over {', '.join(repr(e[2]) for e in others)}")
+
+
+def find_root_or_compound(word, index):
+    entry = index.entries.get(word)
+    if entry is None:
+        print(f"Could not find {word}")
+        return None
+    if word in index.ambiguous:
+        # the claimants at the time of the lookup
+        index.used_ambiguous[word] = index.ambiguous[word][1:]
+    return entry
+
+# Per-process caches for derive_component when compounds are formed in a pool
+component_derivations = DerivationCache()
+component_forms = DerivationCache(compiled=True)
+
+def derive_component(root, year):
+    return component_derivations.apply_sound_changes(root, year)
+
+def derive_component_form(root, year):
+    return component_forms.apply_sound_changes(root, year)
+
+def form_compound_batch(batch, compounds, index, derivations, pool=None, jobs=1, cache=None, engine='word'):
+    """Derive the components of a batch of independent compound rows, then
+    append the compounds in file order."""
+    # apply sound changes up to the year of the compound to each root
+    tasks = list(dict.fromkeys((root, int(row[0])) for row, components in batch for root in components))
+    if engine == 'compiled':
+        # only the forms are needed here, so the composed stages run whole;
+        # the build cache holds histories, so these skip it
+        derive_one = derive_component_form if pool is not None else derivations.apply_sound_changes
+        derived = derive(tasks, derive_one, pool, jobs)
+    else:
+        derive_one = derive_component if pool is not None else derivations.apply_sound_changes
+        derived = derive(tasks, derive_one, pool, jobs, cache, engine == 'batch')
+    forms = {task: word for task, (word, history) in zip(tasks, derived)}
+    for row, components in batch:
+        compound_roots = row[2].split('+')
+        for R, root in zip(list(compound_roots), components):
+            compound_roots[compound_roots.index(R)] = forms[root, int(row[0])]
+        compound = "".join(compound_roots)
+        compounds.append((int(row[0]), compound, row[1], row[2], row[3], row[4]))
+        index.add(compounds[-1])
+
+def form_compounds(roots, pool=None, jobs=1, cache=None, engine='word'):
     compounds = []
+    index = AliasIndex(roots)
+    derivations = DerivationCache(engine == 'compiled')
+    # Rows are batched until one refers to a compound still in the batch, so
+    # each batch only depends on compounds that are already formed
+    batch = []
+    batch_aliases = set()
     for f in ['compounds.csv', 'calendar.csv']:
-        print(f'Loading compounds from {f}')
+        log(f'Loading compounds from {f}')
         with open(f, 'r', encoding='utf-8') as file:
             reader = csv.reader(file)
             next(reader) # Skip the header
             for row in reader:
                 if len(row) == 0: continue
-                compound_roots = row[2]
-                compound_roots = compound_roots.split('+')
-                for R in compound_roots:
-                    root = find_root_or_compound(R, roots, compounds)
+                components = []
+                for R in row[2].split('+'):
+                    if R in batch_aliases:
+                        form_compound_batch(batch, compounds, index, derivations, pool, jobs, cache, engine)
+                        batch = []
+                        batch_aliases = set()
+                    root = find_root_or_compound(R, index)
                     if root is None:
                         raise ValueError(f"Root {R} not found")
-                    # apply sound changes up to the year of the compound to each root
-                    root = apply_sound_changes(root, int(row[0]))[0]
-                    compound_roots[compound_roots.index(R)] = root
-                compound = "".join(compound_roots)
-                compounds.append((int(row[0]), compound, row[1], row[2], row[3], row[4]))
+                    components.append(root)
+                batch.append((row, components))
+                batch_aliases.update(gloss_aliases(row[1]))
+    form_compound_batch(batch, compounds, index, derivations, pool, jobs, cache, engine)
+    index.report_ambiguous()
+    if pool is None and engine != 'batch':
+        log(derivations.report())
     return compounds
 
 import argparse
+import asyncio
+from concurrent.futures import ProcessPoolExecutor
 import csv
+import http
+import sqlite3
+import urllib.parse
+
+def replace_if_changed(temp, filename):
+    """Move `temp` over `filename` unless the file already holds the same
+    bytes, so unchanged outputs keep their timestamps."""
+    if os.path.exists(filename) and filecmp.cmp(temp, filename, shallow=False):
+        os.remove(temp)
+    else:
+        os.replace(temp, filename)
+
+@contextmanager
+def output_file(filename):
+    """Open `filename` for writing through a temporary file that replaces it
+    only once the block completes, so a failed build never leaves a
+    half-written output behind."""
+    temp = filename + '.tmp'
+    try:
+        with open(temp, 'w', encoding='utf-8') as file:
+            yield file
+        replace_if_changed(temp, filename)
+    finally:
+        if os.path.exists(temp):
+            os.remove(temp)
+
+def lookup_entry(input_word, word_after_changes, history):
+    """The (final word, POS, history, romanization, stress, notes) tuple that
+    interactive mode and the server show for a word."""
+    return (format_for_latex(word_after_changes), input_word[4], history,
+            romanization(word_after_changes), mark_stress(word_after_changes), input_word[-1])
+
+def write_dictionary(input_words, histories, max_year=None, database=True):
+    """Write dictionary{_max_year}.tex/.csv (and the site copy), and with
+    `database` dictionary{_max_year}.sqlite, from derived histories.
+    Returns the lookup table used by interactive mode."""
+    interactive_dict = {}
+    latex_entries = {}
+    entries = []
+    for input_word, history in zip(input_words, histories):
+        translation = input_word[2]
+        roots = input_word[3]
+        pos = input_word[4]
+        notes = input_word[-1]
+        word_after_changes, history = snapshot(input_word, history, max_year)
+        
+        entry = lookup_entry(input_word, word_after_changes, history)
+        rom = entry[3]
+        entries.append(get_dictionary_entry(word_after_changes, translation, rom, pos, roots))
+
+        for definition in translation.split('/'):
+            interactive_dict[definition.strip()] = entry
+
+        latex_entries[translation] = (history, translation, roots, pos, notes)
+
+    # the LaTeX is only generated while writing, entry by entry in sorted order
+    latex_entries = [latex_entries[translation] for translation in sorted(latex_entries, key=str.lower)]
+    write_dictionary_files(latex_entries, expand_entries(entries), max_year)
+    if database:
+        suffix = '' if max_year is None else f'_{max_year}'
+        write_dictionary_database(f'dictionary{suffix}.sqlite', input_words, histories, max_year)
+    return interactive_dict
+
+def spaced(field):
+    return field.replace('+', ' + ').replace('/', ' / ')
+
+def expand_entries(entries):
+    """Split entries with several definitions into one entry per definition
+    and sort them for the CSV."""
+    expanded = []
+    for entry in entries:
+        definitions = entry.english.replace('+', ' + ').split('/')
+        tovian, ipa, pos = spaced(entry.tovian), spaced(entry.ipa), spaced(entry.pos)
+        roots = spaced(entry.roots).rstrip()
+        if len(definitions) > 1:
+            for definition in definitions:
+                expanded.append(DictionaryEntry(definition.strip(), tovian, ipa, pos, roots, definitions))
+        else:
+            expanded.append(DictionaryEntry(spaced(entry.english), tovian, ipa, pos, roots))
+    expanded.sort(key=DictionaryEntry.sort_key)
+    return expanded
+
+def write_dictionary_files(latex_entries, entries, max_year=None):
+    """Stream dictionary{_max_year}.tex from (history, translation, roots,
+    pos, notes) tuples and the CSV from sorted DictionaryEntry records, then
+    copy the CSV into site/."""
+    suffix = '' if max_year is None else f'_{max_year}'
+    with output_file(f'dictionary{suffix}.tex') as file:
+        file.write(r'\twocolumn' + '\n')
+        for latex_entry in latex_entries:
+            file.writelines(iter_dictionary_latex(*latex_entry))
+            file.write('\n\n')
+        file.write(r'\onecolumn' + '\n')
+
+    csv_filename = f'dictionary{suffix}.csv'
+    with output_file(csv_filename) as file:
+        writer = csv.writer(file, lineterminator='\n')
+        writer.writerow(['English', 'Tovian', 'IPA', 'Roots'])
+        for entry in entries:
+            writer.writerow(entry.row())
+            writer.writerow([])
+    pages_filename = 'site/' + csv_filename
+    shutil.copyfile(csv_filename, pages_filename + '.tmp')
+    replace_if_changed(pages_filename + '.tmp', pages_filename)
+
+def write_trace(filename, input_words, histories):
+    """Write one JSON object per derivation step: the entry's index in
+    input_words and gloss, the rule number and description, and the form."""
+    descriptions = {}
+    for change in sound_changes:
+        # a few rule numbers are shared by several changes
+        descriptions.setdefault(change.rule, []).append(change.description)
+    descriptions = {rule: ' / '.join(texts) for rule, texts in descriptions.items()}
+    with output_file(filename) as file:
+        for entry, (input_word, history) in enumerate(zip(input_words, histories)):
+            for step, (rule, word) in enumerate(history):
+                record = {'entry': entry, 'gloss': input_word[2], 'rule': rule,
+                          # the first step is the input form at its start year
+                          'description': descriptions.get(rule) if step else None,
+                          'form': mark_stress(word)}
+                file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+def trigrams(key):
+    padded = f'  {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class LookupIndex:
+    """Case-folded indexes over the interactive dictionary, built once for
+    the REPL: English definitions, romanized and IPA forms (with and
+    without the stress mark), a sorted key list for prefix completion and
+    trigram postings for near misses."""
+    __slots__ = ('entries', 'english', 'tovian', 'keys', 'grams')
+
+    def __init__(self, interactive_dict):
+        self.entries = interactive_dict
+        self.english = {}
+        self.tovian = {}
+        for definition, (final_word, pos, history, rom, stress, notes) in interactive_dict.items():
+            self.english[definition.casefold()] = definition
+            for form in dict.fromkeys([rom.casefold(), stress, unmark_stress(stress)]):
+                self.tovian.setdefault(form, []).append(definition)
+        self.keys = sorted(self.english.keys() | self.tovian.keys())
+        self.grams = {}
+        for i, key in enumerate(self.keys):
+            for gram in trigrams(key):
+                self.grams.setdefault(gram, []).append(i)
+
+    def lookup(self, query):
+        """Definitions matching `query` exactly, in either language."""
+        query = query.casefold()
+        if query in self.english:
+            return [self.english[query]]
+        return self.tovian.get(query.strip('/').replace('.', ''), [])
+
+    def describe(self, key):
+        if key in self.english:
+            return self.english[key]
+        return f"{key} ({', '.join(self.tovian[key])})"
+
+    def complete(self, prefix, limit=10):
+        """Keys starting with `prefix`, in sorted order."""
+        prefix = prefix.casefold()
+        start = bisect_left(self.keys, prefix)
+        matches = []
+        for key in self.keys[start:start + limit]:
+            if not key.startswith(prefix):
+                break
+            matches.append(key)
+        return matches
+
+    def similar(self, query, limit=5, threshold=0.3):
+        """Keys sharing the most trigrams with `query`."""
+        grams = trigrams(query.casefold())
+        shared = Counter(chain.from_iterable(self.grams.get(gram, ()) for gram in grams))
+        scored = []
+        for i, count in shared.items():
+            # Jaccard similarity of the two trigram sets
+            score = count / (len(grams) + len(self.keys[i]) + 1 - count)
+            if score >= threshold:
+                scored.append((-score, self.keys[i]))
+        return [key for _, key in sorted(scored)[:limit]]
+
+def run_interactive(index):
+    print("Interactive mode enabled. Type 'q' to quit.")
+    while True:
+        user_input = input("Enter a word or definition: ").strip().lower()
+        if user_input == 'q':
+            break
+        definitions = index.lookup(user_input)
+        if not definitions:
+            suggestions = index.complete(user_input) or index.similar(user_input)
+            if suggestions:
+                print('Did you mean: ' + '; '.join(index.describe(key) for key in suggestions))
+            else:
+                print("Word not found in the dictionary. 'q' to quit.")
+            continue
+        if index.english.get(user_input) is None:
+            print(f"English: {' / '.join(definitions)}")
+        # synonyms share one entry, so show it once
+        shown = set()
+        for definition in definitions:
+            final_word, pos, history, rom, stress, note = index.entries[definition]
+            if (rom, pos) in shown:
+                continue
+            shown.add((rom, pos))
+            print(f"Final Word: {final_word}, POS: {pos}, Romanization: {rom}, Stress: {stress}")
+            if note!="_" and note:
+                print(f"Note: {note}")
+            for rule, word in history:
+                print(f'{rule}: {mark_stress(word)}')
+
+# Local query server: `build_dictionary.py serve` derives the lexicon once
+# (through the build cache) and answers JSON lookups from LookupIndex.
+
+LEXICON_SOURCES = ['roots.csv', 'compounds.csv', 'calendar.csv', 'borrowed.csv']
+
+class Lexicon:
+    """Every derived word with the indexes the server answers from."""
+    __slots__ = ('input_words', 'histories', 'numbers', 'index', 'descriptions', 'parser', 'meanings')
+
+    def __init__(self, input_words, histories):
+        self.input_words = input_words
+        self.histories = histories
+        # entry number of each definition, for answers at a given year
+        self.numbers = {}
+        # definitions of each unstressed IPA form, for parse(); the lookup
+        # index also has the romanized spellings as keys
+        self.meanings = {}
+        entries = {}
+        forms = []
+        for number, (input_word, history) in enumerate(zip(input_words, histories)):
+            word_after_changes, history = snapshot(input_word, history, None)
+            forms.append(word_after_changes)
+            entry = lookup_entry(input_word, word_after_changes, history)
+            meanings = self.meanings.setdefault(word_after_changes.replace(stress_mark, ''), [])
+            for definition in input_word[2].split('/'):
+                entries[definition.strip()] = entry
+                self.numbers[definition.strip()] = number
+                meanings.append(definition.strip())
+        self.index = LookupIndex(entries)
+        self.parser = RomanizationParser(consonants + vowels + '-', forms)
+        self.descriptions = {}
+        for change in sound_changes:
+            self.descriptions.setdefault(change.rule, []).append(change.description)
+
+    def entry(self, definition, year=None, history=False):
+        input_word = self.input_words[self.numbers[definition]]
+        word, steps = snapshot(input_word, self.histories[self.numbers[definition]], year)
+        result = {
+            'english': definition,
+            'gloss': input_word[2],
+            'tovian': romanization(word),
+            'ipa': mark_stress(word),
+            'pos': input_word[4],
+            'roots': input_word[3],
+            'notes': input_word[-1],
+            'year': year,
+        }
+        if history:
+            result['history'] = [{'rule': rule, 'description': ' / '.join(self.descriptions.get(rule, [])) if i else None,
+                                  'form': mark_stress(form)} for i, (rule, form) in enumerate(steps)]
+        return result
+
+    def parse(self, text):
+        """IPA readings of romanized `text`, with the definitions of those
+        that are words of the lexicon."""
+        return {'query': text, 'candidates': [{'ipa': form, 'english': self.meanings.get(form, [])}
+                                              for form in self.parser.candidates(text)]}
+
+    def query(self, text, year=None, history=False):
+        """Answer one English, romanized or IPA query."""
+        definitions = self.index.lookup(text)
+        result = {'query': text, 'matches': [self.entry(definition, year, history) for definition in definitions]}
+        if not definitions:
+            result['suggestions'] = self.index.complete(text) or self.index.similar(text)
+        return result
+
+def load_lexicon(cache=None):
+    if cache is not None:
+        cache.begin()
+    roots = load_roots()
+    input_words = roots + form_compounds(roots, cache=cache) + load_borrowed()
+    derived = derive([(input_word, None) for input_word in input_words], apply_sound_changes, cache=cache)
+    histories = HistoryStore(history for _, history in derived)
+    if cache is not None:
+        cache.save()
+        log(cache.report())
+    return Lexicon(input_words, histories)
+
+def source_mtimes():
+    return [os.stat(name).st_mtime_ns for name in LEXICON_SOURCES]
+
+class LexiconServer:
+    """Minimal HTTP/1.1 JSON API over a Lexicon:
+
+        GET  /lookup?q=WORD[&year=N]     matches in English, romanization or IPA
+        GET  /history?q=WORD[&year=N]    the same with each derivation step
+        GET  /batch?q=A&q=B[&year=N]     several lookups at once
+        GET  /parse?q=ROMANIZED          IPA readings, known words first
+        POST /batch  {"queries": [...], "year": N, "history": false}
+
+    The lexicon is rebuilt in a worker thread when a source CSV changes and
+    swapped in once it is ready; requests keep using the old one until then.
+    """
+    __slots__ = ('lexicon', 'cache', 'mtimes')
+
+    def __init__(self, cache=None):
+        self.cache = cache
+        self.mtimes = source_mtimes()
+        self.lexicon = load_lexicon(cache)
+
+    async def watch(self, interval=1.0):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                mtimes = source_mtimes()
+            except FileNotFoundError:
+                continue
+            if mtimes != self.mtimes:
+                self.mtimes = mtimes
+                try:
+                    self.lexicon = await loop.run_in_executor(None, load_lexicon, self.cache)
+                    log('Reloaded the lexicon')
+                except (OSError, ValueError, IndexError) as error:
+                    print(f'Keeping the previous lexicon: {error}')
+
+    def answer(self, method, path, body):
+        url = urllib.parse.urlsplit(path)
+        params = urllib.parse.parse_qs(url.query)
+        year = int(params['year'][0]) if 'year' in params else None
+        lexicon = self.lexicon
+        if url.path in ('/lookup', '/history') and method == 'GET':
+            if 'q' not in params:
+                return 400, {'error': 'missing q'}
+            return 200, lexicon.query(params['q'][0], year, url.path == '/history')
+        if url.path == '/parse' and method == 'GET':
+            if 'q' not in params:
+                return 400, {'error': 'missing q'}
+            return 200, lexicon.parse(params['q'][0])
+        if url.path == '/batch' and method == 'GET':
+            return 200, {'results': [lexicon.query(text, year) for text in params.get('q', [])]}
+        if url.path == '/batch' and method == 'POST':
+            request = json.loads(body or b'{}')
+            if not isinstance(request, dict):
+                raise ValueError('body must be a JSON object')
+            year = request.get('year', year)
+            queries = request.get('queries', [])
+            if year is not None and (not isinstance(year, int) or isinstance(year, bool)):
+                raise ValueError('year must be an integer')
+            if not isinstance(queries, list) or not all(isinstance(text, str) for text in queries):
+                raise ValueError('queries must be a list of strings')
+            history = bool(request.get('history'))
+            return 200, {'results': [lexicon.query(text, year, history) for text in queries]}
+        return 404, {'error': f'no route for {method} {url.path}'}
+
+    async def handle(self, reader, writer):
+        try:
+            request_line = (await reader.readline()).decode('latin-1').split()
+            headers = {}
+            while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            body = await reader.readexactly(int(headers.get('content-length', 0)))
+            if len(request_line) < 2:
+                status, result = 400, {'error': 'bad request line'}
+            else:
+                try:
+                    status, result = self.answer(request_line[0], request_line[1], body)
+                except ValueError as error:
+                    status, result = 400, {'error': str(error)}
+            data = json.dumps(result, ensure_ascii=False).encode('utf-8')
+            writer.write(f'HTTP/1.1 {status} {http.HTTPStatus(status).phrase}\r\n'
+                         'Content-Type: application/json; charset=utf-8\r\n'
+                         'Access-Control-Allow-Origin: *\r\n'
+                         f'Content-Length: {len(data)}\r\n'
+                         'Connection: close\r\n\r\n'.encode('latin-1') + data)
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle, host, port)
+        log(f'Serving {len(self.lexicon.input_words)} words on http://{host}:{port}')
+        async with server:
+            await asyncio.gather(server.serve_forever(), self.watch())
+
+DATABASE_SCHEMA = """
+CREATE TABLE entries (
+    id INTEGER PRIMARY KEY,  -- position in the build's input order
+    gloss TEXT NOT NULL,     -- as in the source CSV, '/'-separated
+    year INTEGER NOT NULL,   -- start year, -1 for words outside the cascade
+    proto TEXT NOT NULL,     -- input form
+    word TEXT NOT NULL,      -- derived form
+    romanization TEXT NOT NULL,
+    ipa TEXT NOT NULL,       -- stressed, with syllable dots
+    pos TEXT NOT NULL,
+    roots TEXT NOT NULL,
+    notes TEXT NOT NULL
+);
+CREATE TABLE synonyms (
+    entry_id INTEGER NOT NULL REFERENCES entries(id),
+    position INTEGER NOT NULL,
+    english TEXT NOT NULL,
+    PRIMARY KEY (entry_id, position)
+);
+CREATE TABLE components (
+    entry_id INTEGER NOT NULL REFERENCES entries(id),
+    position INTEGER NOT NULL,
+    component TEXT NOT NULL,  -- gloss of the root or compound it joins
+    PRIMARY KEY (entry_id, position)
+);
+CREATE TABLE rules (
+    position INTEGER PRIMARY KEY,  -- order in the cascade
+    number INTEGER NOT NULL,       -- not unique: a few changes share a year
+    description TEXT NOT NULL
+);
+CREATE TABLE history (
+    entry_id INTEGER NOT NULL REFERENCES entries(id),
+    step INTEGER NOT NULL,   -- 0 is the input form at its start year
+    rule INTEGER NOT NULL,   -- rules.number, or the start year for step 0
+    form TEXT NOT NULL,      -- with the stress mark
+    PRIMARY KEY (entry_id, step)
+);
+CREATE INDEX synonyms_english ON synonyms (english COLLATE NOCASE);
+CREATE INDEX entries_romanization ON entries (romanization COLLATE NOCASE);
+CREATE INDEX entries_word ON entries (word);
+CREATE INDEX entries_ipa ON entries (ipa);
+CREATE INDEX components_component ON components (component);
+CREATE INDEX rules_number ON rules (number);
+"""
+
+DATABASE_FTS = """
+CREATE VIRTUAL TABLE entries_fts USING fts5 (gloss, notes, content='entries', content_rowid='id');
+INSERT INTO entries_fts (entries_fts) VALUES ('rebuild');
+"""
+
+def write_dictionary_database(filename, input_words, histories, max_year=None):
+    """Write the derived lexicon to a fresh SQLite database in one
+    transaction. The full-text table is skipped if SQLite lacks FTS5."""
+    temp = filename + '.tmp'
+    if os.path.exists(temp):
+        os.remove(temp)
+    entries, synonyms, components, steps = [], [], [], []
+    for entry_id, (input_word, history) in enumerate(zip(input_words, histories)):
+        word, history = snapshot(input_word, history, max_year)
+        entries.append((entry_id, input_word[2], input_word[0], input_word[1], word, romanization(word),
+                        dotted_with_stress(unmark_stress(word)), input_word[4], input_word[3], input_word[-1]))
+        synonyms.extend((entry_id, position, definition.strip())
+                        for position, definition in enumerate(input_word[2].split('/')))
+        if input_word[3] != '_':
+            components.extend((entry_id, position, component.strip())
+                              for position, component in enumerate(input_word[3].split('+')))
+        steps.extend((entry_id, step, rule, mark_stress(form)) for step, (rule, form) in enumerate(history))
+    # the transaction is opened and committed here: executescript() and
+    # the sqlite3 module's own transactions commit before any CREATE
+    connection = sqlite3.connect(temp, isolation_level=None)
+    try:
+        connection.execute('BEGIN')
+        for statement in DATABASE_SCHEMA.split(';'):
+            connection.execute(statement)
+        connection.executemany('INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', entries)
+        connection.executemany('INSERT INTO synonyms VALUES (?, ?, ?)', synonyms)
+        connection.executemany('INSERT INTO components VALUES (?, ?, ?)', components)
+        connection.executemany('INSERT INTO rules VALUES (?, ?, ?)',
+                               ((position, change.rule, change.description) for position, change in enumerate(sound_changes)))
+        connection.executemany('INSERT INTO history VALUES (?, ?, ?, ?)', steps)
+        try:
+            for statement in DATABASE_FTS.split(';'):
+                connection.execute(statement)
+        except sqlite3.OperationalError as error:
+            print(f'Skipping the full-text index in {filename}: {error}')
+        connection.execute('COMMIT')
+    finally:
+        # without the COMMIT, closing rolls everything back
+        connection.close()
+    replace_if_changed(temp, filename)
+
+def parse_years(value):
+    return [int(year) for year in value.split(',')]
+
 # Main function
 def main():
     parser = argparse.ArgumentParser(description='Build a dictionary from roots, compounds, and borrowed words.')
     parser.add_argument('--interactive','-i', action='store_true', help='Run in interactive mode')
-    parser.add_argument('--max_year', '-y', type=int, help='Maximum year for sound changes')
+    years = parser.add_mutually_exclusive_group()
+    years.add_argument('--max_year', '-y', type=int, help='Maximum year for sound changes')
+    years.add_argument('--years', type=parse_years, help='Comma-separated maximum years; derives every word once and writes a dictionary_{year} snapshot for each')
+    parser.add_argument('--jobs', '-j', type=int, default=1, help='Number of worker processes for deriving words')
+    parser.add_argument('--engine', choices=['word', 'batch', 'compiled'], default='word', help='Derive word by word, rule by rule across the whole lexicon, or through the compiled cascade')
+    parser.add_argument('--check-engine', action='store_true', help='Derive every word again with the word engine and report any differences')
+    parser.add_argument('--cache-dir', default='.build_cache', help='Directory for derivations reused by later builds')
+    parser.add_argument('--no-cache', action='store_true', help='Derive every word from scratch and leave the cache untouched')
+    levels = parser.add_mutually_exclusive_group()
+    levels.add_argument('--quiet', '-q', action='store_true', help='Only print warnings')
+    levels.add_argument('--verbose', '-v', action='store_true', help='Also print every derivation')
+    parser.add_argument('--no-database', action='store_true', help='Do not write the dictionary{_year}.sqlite database')
+    parser.add_argument('--trace', metavar='FILE', help='Write every derivation step to FILE as JSON Lines')
+    parser.add_argument('--profile-rules', metavar='FILE', help='Time and count every rule, print a report and write it to FILE as JSON; derives every word in this process with the word engine')
+    commands = parser.add_subparsers(dest='command')
+    serve_parser = commands.add_parser('serve', help='Answer lookups over a local JSON API instead of writing the dictionary')
+    serve_parser.add_argument('--host', default='127.0.0.1', help='Address to listen on')
+    serve_parser.add_argument('--port', type=int, default=8765, help='Port to listen on')
     args = parser.parse_args()
 
+    global rule_profile, verbosity
+    verbosity = QUIET if args.quiet else VERBOSE if args.verbose else SUMMARY
+    if args.command == 'serve':
+        server = LexiconServer(None if args.no_cache else BuildCache(args.cache_dir))
+        try:
+            asyncio.run(server.serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        return
+    if args.profile_rules:
+        # every word has to go through record_changes here to be counted
+        rule_profile = RuleProfile()
+        args.jobs, args.engine, args.no_cache = 1, 'word', True
+
+    pool = ProcessPoolExecutor(max_workers=args.jobs) if args.jobs > 1 else None
+    cache = None if args.no_cache else BuildCache(args.cache_dir)
     roots = load_roots()
-    compounds = form_compounds(roots)
+    compounds = form_compounds(roots, pool, args.jobs, cache, args.engine)
     borrowed = load_borrowed() 
 
     input_words = roots + compounds + borrowed 
-    interactive_dict = {}
-    latex_histories = {}
-    csv_histories = []
-    for input_word in input_words:
-        year = input_word[0]
-        translation = input_word[2]
-        roots = input_word[3]
-        pos = input_word[4]
-        notes = input_word[-1]
-        word_after_changes, history = apply_sound_changes(input_word, max_year=args.max_year)
-        
-        final_word = format_for_latex(word_after_changes)
-        if not args.interactive:
+    if args.years is None:
+        snapshot_years = [args.max_year]
+        derive_until = args.max_year
+    else:
+        # each snapshot is a prefix of the derivation up to the latest one
+        snapshot_years = args.years
+        derive_until = max(args.years)
+    tasks = [(input_word, derive_until) for input_word in input_words]
+    derive_one = apply_sound_changes_compiled if args.engine == 'compiled' else apply_sound_changes
+    expected = map_tasks(apply_sound_changes, tasks, pool, args.jobs) if args.check_engine else None
+    mismatches = []
+    # later stages only read the histories, so each one is packed as soon as
+    # it is derived
+    histories = HistoryStore()
+    for task, result in zip(tasks, derive(tasks, derive_one, pool, args.jobs, cache, args.engine == 'batch')):
+        if expected is not None and result != next(expected):
+            mismatches.append(task[0][1])
+        if verbosity >= VERBOSE and not args.interactive:
+            word_after_changes, history = result
             for rule, word in history:
                 print(f'{rule}: {mark_stress(word)}')
-        
-        rom = romanization(word_after_changes)
-        stress = mark_stress(word_after_changes)
-        csv_history = get_dictionary_csv(word_after_changes, translation, stress, rom, pos, notes, roots)
-        csv_histories.append(csv_history)
-        
-
-        for definition in translation.split('/'):
-            interactive_dict[definition.strip()] = (final_word, pos, history, rom, stress, notes)
-        
-        if not args.interactive:
-            print(stress)
-            print(rom)
+            print(mark_stress(word_after_changes))
+            print(romanization(word_after_changes))
             print()
-
-        latex_history = get_dictionary_latex(history, translation, roots, pos, notes)
-        latex_histories[translation] = latex_history
-
-    # sort latex_histories by key
-    latex_histories = OrderedDict(sorted(latex_histories.items(), key=lambda x: x[0].lower()))
-    
-    # split csv histories into duplicate entries if multiple definitions with /
-    expanded_csv_histories = []
-    for csv_history in csv_histories:
-       # add identical column as _
-        csv_history = csv_history.replace("+", " + ")
-        words = csv_history.strip().split(',')[0].split('/')
-        csv_history = csv_history.replace("/", " / ")
-        if len(words) > 1:
-            for w in words:
-                parts = csv_history.strip().split(',')
-                new_csv = f'{w.strip()},' + ','.join(parts[1:])
-                # add to identical column
-                new_csv = new_csv.rsplit(',',0)[0] +","+ " / ".join(words)
-                expanded_csv_histories.append(new_csv)
-        else:
-            expanded_csv_histories.append(csv_history.strip()+',_')
-            
-    # sort csv_histories by the first line's final word, numbers at end of list, pos=CASE at end of list 
-    def sort_dict(x):
-        first_line = x.splitlines()[0]
-        first_word = first_line.split('","')[0].strip('"').lower()
-        pos = first_line.split(',')[3].strip('"')
-        # if pos is 'case' or 'ps' or 'ns', put at end
-        if pos in ['CASE', 'CLASS', 'PLURAL', 'MOOD', 'VOICE', 'ASPECT', 'PLACEHOLDER']:
-            return 'zzz' + first_word
-        if not first_word[0].isdigit():
-            return first_word
-        else:
-            return 'zzzz' + first_word
-    expanded_csv_histories = sorted(expanded_csv_histories, key=sort_dict)
-    # remove columns 'POS' and 'Identical' from csv histories (columns 3 and 5)
-    expanded_csv_histories = [','.join(line.split(',')[:-1]) for line in expanded_csv_histories]
-    expanded_csv_histories = [','.join(line.split(',')[:3]+line.split(',')[4:]) for line in expanded_csv_histories]
-   
-    
-    filename = 'dictionary.tex'
-    if args.max_year is not None:
-        filename = f'dictionary_{args.max_year}.tex'
-    with open(filename, 'w', encoding='utf-8') as file:
-        file.write(r'\twocolumn' + '\n')
-        for translation, latex_history in latex_histories.items():
-            file.write(latex_history + '\n\n')
-        file.write(r'\onecolumn' + '\n')
-    
-    csv_filename = 'dictionary.csv'
-    if args.max_year is not None:
-        csv_filename = f'dictionary_{args.max_year}.csv'
-    pages_filename='site/'+csv_filename
-    for fname in [csv_filename, pages_filename]:
-        with open(fname, 'w', encoding='utf-8') as file:
-            file.write('English,Tovian,IPA,Roots\n')
-            for csv_history in expanded_csv_histories:
-                file.write(csv_history + '\n\n')
-            
+        histories.append(result[1])
+    if expected is not None:
+        print(f'Engine check: {len(mismatches)} of {len(tasks)} derivations differ from the word engine')
+        for word in mismatches:
+            print(f'  {word}')
+    if cache is not None:
+        cache.save()
+        log(cache.report())
+        # the cache holds every history it saved; let it go
+        cache = None
+    log(f'Derived {len(histories)} words')
+    if args.trace:
+        write_trace(args.trace, input_words, histories)
+        log(f'Wrote the derivations to {args.trace}')
+    if pool is not None:
+        pool.shutdown()
+    if prefilter_counts['calls']:
+        log(f"Trigger checks skipped {prefilter_counts['skipped']} of {prefilter_counts['calls']} rule calls")
+    if rule_profile is not None:
+        print(rule_profile.report())
+        rule_profile.save(args.profile_rules)
+
+    for max_year in snapshot_years:
+        interactive_dict = write_dictionary(input_words, histories, max_year, not args.no_database)
+    if unsyllabified:
+        log(f'No syllables found in {len(unsyllabified)} forms (--verbose lists them)', QUIET)
         
     if args.interactive:
-        print("Interactive mode enabled. Type 'q' to quit.")
-        while True:
-            user_input = input("Enter a word or definition: ").strip().lower()
-            if user_input == 'q':
-                break
-            dict_lower_keys = {k.lower(): v for k,v in interactive_dict.items()}
-            if user_input in dict_lower_keys.keys():
-                final_word, pos, history, rom, stress, note = dict_lower_keys[user_input]
-                print(f"Final Word: {final_word}, POS: {pos}, Romanization: {rom}, Stress: {stress}")
-                if note!="_" and note:
-                    print(f"Note: {note}")
-                for rule, word in history:
-                    print(f'{rule}: {mark_stress(word)}')
-            else:
-                print("Word not found in the dictionary. 'q' to quit.")
+        run_interactive(LookupIndex(interactive_dict))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""Time the stages of the dictionary build and the individual sound changes.
+
+Runs against the real CSVs (scale 1) and against copies of the lexicon
+scaled up N times (or, with --generated, a synthetic lexicon N times the
+size from generate_lexicon.py), reports the median of several runs and the memory each
+stage allocates, and can save the results as a JSON baseline or compare
+them with an earlier one:
+
+    python scripts/benchmark.py --scales 1,10,100 --save baseline.json
+    python scripts/benchmark.py --compare baseline.json
+"""
+import argparse
+import contextlib
+import csv
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+import build_dictionary as bd
+from generate_lexicon import generate_lexicon
+
+INPUTS = ['roots.csv', 'compounds.csv', 'calendar.csv', 'borrowed.csv']
+OBSOLETE = ' (obsolete)'
+
+def scaled_gloss(gloss, copy):
+    # each copy gets its own glosses, so compounds only refer within a copy
+    if copy == 0:
+        return gloss
+    obsolete = OBSOLETE in gloss
+    gloss = gloss.replace(OBSOLETE, '')
+    gloss = '/'.join(f'{alternative}~{copy}' for alternative in gloss.split('/'))
+    return gloss + OBSOLETE if obsolete else gloss
+
+def write_scaled_inputs(directory, scale):
+    """Write the input CSVs to `directory` with every row repeated `scale`
+    times under distinct glosses."""
+    for name in INPUTS:
+        with open(ROOT / name, encoding='utf-8') as file:
+            rows = [row for row in csv.reader(file)]
+        header, rows = rows[0], [row for row in rows[1:] if row]
+        with open(Path(directory) / name, 'w', encoding='utf-8', newline='') as file:
+            writer = csv.writer(file, lineterminator='\n')
+            writer.writerow(header)
+            for copy in range(scale):
+                for row in rows:
+                    row = list(row)
+                    if name in ('roots.csv', 'borrowed.csv'):
+                        row[2] = scaled_gloss(row[2], copy)
+                    else:
+                        row[1] = scaled_gloss(row[1], copy)
+                        row[2] = '+'.join(scaled_gloss(root, copy) for root in row[2].split('+'))
+                    writer.writerow(row)
+    os.makedirs(Path(directory) / 'site', exist_ok=True)
+
+def write_generated_inputs(directory, scale):
+    """Write a synthetic lexicon `scale` times the size of the real one."""
+    sizes = {}
+    for name in INPUTS:
+        with open(ROOT / name, encoding='utf-8') as file:
+            sizes[name] = sum(1 for row in csv.reader(file) if row) - 1
+    generate_lexicon(directory, roots=scale * (sizes['roots.csv'] + sizes['borrowed.csv']),
+                     compounds=scale * (sizes['compounds.csv'] + sizes['calendar.csv']), seed=scale)
+
+def measure(function, repeat, memory):
+    """Run `function` `repeat` times and return (median seconds, result,
+    allocation stats of one extra traced run)."""
+    times = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    stats = {'median': statistics.median(times), 'min': min(times)}
+    if memory:
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        function()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        stats['peak_kib'] = round((peak - before) / 1024, 1)
+        stats['retained_kib'] = round((current - before) / 1024, 1)
+    return stats, result
+
+def benchmark_stages(scale, repeat, memory, engine, generated=False):
+    """Time each build stage on the lexicon scaled `scale` times."""
+    stages = {}
+    with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(io.StringIO()):
+        if generated and scale > 1:
+            write_generated_inputs(directory, scale)
+        else:
+            write_scaled_inputs(directory, scale)
+        cwd = os.getcwd()
+        os.chdir(directory)
+        try:
+            stages['load_roots'], roots = measure(bd.load_roots, repeat, memory)
+            stages['form_compounds'], compounds = measure(
+                lambda: bd.form_compounds(roots, engine=engine), repeat, memory)
+            input_words = roots + compounds + bd.load_borrowed()
+            tasks = [(input_word, None) for input_word in input_words]
+            derive_one = bd.apply_sound_changes_compiled if engine == 'compiled' else bd.apply_sound_changes
+            stages['derive'], derived = measure(
+                lambda: list(bd.derive(tasks, derive_one, batch=engine == 'batch')), repeat, memory)
+            histories = [history for _, history in derived]
+
+            latex_entries = {input_word[2]: (history, input_word[2], input_word[3], input_word[4], input_word[-1])
+                             for input_word, history in zip(input_words, histories)}
+            latex_entries = [latex_entries[translation] for translation in sorted(latex_entries, key=str.lower)]
+            stages['get_dictionary_latex'], _ = measure(
+                lambda: [bd.get_dictionary_latex(*latex_entry) for latex_entry in latex_entries], repeat, memory)
+
+            entries = [bd.get_dictionary_entry(word, input_word[2], bd.romanization(word), input_word[4], input_word[3])
+                       for input_word, (word, history) in zip(input_words, derived)]
+            stages['expand_entries'], expanded = measure(lambda: bd.expand_entries(entries), repeat, memory)
+
+            def write():
+                for name in ('dictionary.tex', 'dictionary.csv', 'site/dictionary.csv'):
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(name)
+                bd.write_dictionary_files(latex_entries, expanded)
+            stages['write_files'], _ = measure(write, repeat, memory)
+        finally:
+            os.chdir(cwd)
+    return {'words': len(input_words), 'stages': stages}
+
+def rule_inputs(input_words):
+    """The Word each sound change sees for each real input, per rule index."""
+    inputs = [[] for _ in bd.sound_changes]
+    for year, word, *_ in input_words:
+        if year == -1:
+            continue
+        word = bd.Word(bd.unmark_stress(word))
+        start = bd.bisect_left(bd.rule_numbers, year)
+        for index in range(start, len(bd.sound_changes)):
+            inputs[index].append(word)
+            result = bd.sound_changes[index].apply(word)
+            changed = bd.unmark_stress(result) if bd.stress_mark in result else result
+            if changed != word:
+                word = bd.Word(changed)
+    return inputs
+
+def benchmark_rules(repeat):
+    """Time each sound change on the forms the real lexicon feeds it."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        cwd = os.getcwd()
+        os.chdir(ROOT)
+        try:
+            roots = bd.load_roots()
+            input_words = roots + bd.form_compounds(roots) + bd.load_borrowed()
+        finally:
+            os.chdir(cwd)
+        inputs = rule_inputs(input_words)
+        rules = []
+        for index, (change, words) in enumerate(zip(bd.sound_changes, inputs)):
+            def run():
+                trigger = change.trigger
+                for word in words:
+                    if trigger is None or trigger(word):
+                        change.apply(word)
+            stats, _ = measure(run, repeat, False)
+            rules.append({'index': index, 'rule': change.rule, 'description': change.description,
+                          'calls': len(words), 'median': stats['median']})
+    return rules
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_stages(results, baseline=None):
+    for scale, result in results['scales'].items():
+        print(f'Scale {scale}x ({result["words"]} words)')
+        old = (baseline or {}).get('scales', {}).get(scale, {}).get('stages', {})
+        for stage, stats in result['stages'].items():
+            line = f'  {stage:<22} {stats["median"] * 1000:10.1f} ms'
+            if 'peak_kib' in stats:
+                line += f'  peak {stats["peak_kib"]:10.1f} KiB'
+            if stage in old:
+                line += f'  {stats["median"] / old[stage]["median"]:6.2f}x baseline'
+            print(line)
+
+def print_rules(results, baseline=None, top=15):
+    old = {rule['index']: rule for rule in (baseline or {}).get('rules', [])}
+    print(f'Slowest {top} sound changes on the real lexicon')
+    for rule in sorted(results['rules'], key=lambda rule: rule['median'], reverse=True)[:top]:
+        line = f'  {rule["rule"]:>6} {rule["description"][:44]:<44} {rule["median"] * 1000:8.2f} ms  {rule["calls"]:6} calls'
+        if rule['index'] in old and old[rule['index']]['rule'] == rule['rule'] and old[rule['index']]['median']:
+            line += f'  {rule["median"] / old[rule["index"]]["median"]:6.2f}x baseline'
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the dictionary build.')
+    parser.add_argument('--scales', default='1,10,100', help='Comma-separated lexicon scales; 1 is the real CSVs')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per stage; the median is reported')
+    parser.add_argument('--generated', action='store_true', help='Use synthetic lexicons for scales above 1 instead of copies of the real one')
+    parser.add_argument('--engine', choices=['word', 'batch', 'compiled'], default='word', help='Derivation engine to time')
+    parser.add_argument('--no-memory', action='store_true', help='Skip the traced run that measures allocations')
+    parser.add_argument('--no-rules', action='store_true', help='Skip timing individual sound changes')
+    parser.add_argument('--save', help='Write the results to this JSON file')
+    parser.add_argument('--compare', help='Show timings relative to this JSON baseline')
+    args = parser.parse_args()
+
+    results = {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'engine': args.engine,
+        'generated': args.generated,
+        'repeat': args.repeat,
+        'scales': {},
+    }
+    for scale in (int(value) for value in args.scales.split(',')):
+        results['scales'][str(scale)] = benchmark_stages(scale, args.repeat, not args.no_memory, args.engine, args.generated)
+    if not args.no_rules:
+        results['rules'] = benchmark_rules(args.repeat)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as file:
+            baseline = json.load(file)
+        print(f'Compared with {args.compare} (commit {baseline.get("commit")})')
+    print_stages(results, baseline)
+    if not args.no_rules:
+        print_rules(results, baseline)
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2, ensure_ascii=False)
+            file.write('\n')
+        print(f'Wrote {args.save}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Write a synthetic lexicon for stress-testing the dictionary build.
+
+The output directory gets roots.csv and compounds.csv in the same format as
+the real ones, plus header-only calendar.csv and borrowed.csv, so
+build_dictionary.py can run in it unchanged:
+
+    python scripts/generate_lexicon.py --roots 100000 --out /tmp/lexicon
+    cd /tmp/lexicon && python /path/to/build_dictionary.py --no-cache
+
+Proto-forms are built from the consonant and vowel inventories of
+build_dictionary.py. The same seed always gives the same files.
+"""
+import argparse
+import csv
+import os
+import random
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from build_dictionary import consonants, vowels, rule_numbers
+
+# Syllables per root, weighted like the real roots (mostly two or three)
+SYLLABLE_COUNTS = [1, 2, 3, 4]
+SYLLABLE_WEIGHTS = [20, 45, 30, 5]
+ONSET_PROBABILITY = 0.8
+CODA_PROBABILITY = 0.3
+
+PARTS_OF_SPEECH = ['N', 'Ns', 'V', 'P', 'INT']
+PART_OF_SPEECH_WEIGHTS = [80, 4, 10, 3, 3]
+
+def proto_form(rng):
+    syllables = []
+    for _ in range(rng.choices(SYLLABLE_COUNTS, SYLLABLE_WEIGHTS)[0]):
+        syllable = rng.choice(vowels)
+        if rng.random() < ONSET_PROBABILITY:
+            syllable = rng.choice(consonants) + syllable
+        if rng.random() < CODA_PROBABILITY:
+            syllable += rng.choice(consonants)
+        syllables.append(syllable)
+    return ''.join(syllables)
+
+def generate_lexicon(directory, roots=1000, compounds=None, depth=3, seed=0, max_year=None):
+    """Write the synthetic CSVs to `directory`. Compounds join two or three
+    earlier entries and nest at most `depth` levels deep."""
+    rng = random.Random(seed)
+    compounds = roots if compounds is None else compounds
+    max_year = rule_numbers[-1] if max_year is None else max_year
+    os.makedirs(directory, exist_ok=True)
+    # (gloss, year, depth) of every entry a compound may refer to
+    entries = []
+    with open(os.path.join(directory, 'roots.csv'), 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file, lineterminator='\n')
+        writer.writerow(['Year', 'Word', 'Translation', 'Roots', 'POS', 'Note'])
+        for i in range(roots):
+            year = rng.randint(0, max_year)
+            gloss = f'root{i}'
+            pos = rng.choices(PARTS_OF_SPEECH, PART_OF_SPEECH_WEIGHTS)[0]
+            writer.writerow([year, proto_form(rng), gloss, '_', pos, '_'])
+            entries.append((gloss, year, 0))
+    with open(os.path.join(directory, 'compounds.csv'), 'w', encoding='utf-8', newline='') as file:
+        writer = csv.writer(file, lineterminator='\n')
+        writer.writerow(['Year', 'Translation', 'Roots', 'POS', 'Note'])
+        nestable = list(entries)
+        for i in range(compounds):
+            components = rng.sample(nestable, rng.choice([2, 2, 3]))
+            # a compound forms after its components exist
+            year = rng.randint(max(entry[1] for entry in components), max_year)
+            level = 1 + max(entry[2] for entry in components)
+            gloss = f'compound{i}'
+            pos = rng.choices(PARTS_OF_SPEECH, PART_OF_SPEECH_WEIGHTS)[0]
+            writer.writerow([year, gloss, '+'.join(entry[0] for entry in components), pos, '_'])
+            if level < depth:
+                nestable.append((gloss, year, level))
+    with open(os.path.join(directory, 'calendar.csv'), 'w', encoding='utf-8', newline='') as file:
+        file.write('Year,Translation,Roots,POS,Note\n')
+    with open(os.path.join(directory, 'borrowed.csv'), 'w', encoding='utf-8', newline='') as file:
+        file.write('Year,Word,Translation,From,unused,POS,Note\n')
+    os.makedirs(os.path.join(directory, 'site'), exist_ok=True)
+
+def main():
+    parser = argparse.ArgumentParser(description='Write a synthetic lexicon for scale testing.')
+    parser.add_argument('--out', required=True, help='Directory for the generated CSVs')
+    parser.add_argument('--roots', type=int, default=1000, help='Number of roots')
+    parser.add_argument('--compounds', type=int, help='Number of compounds (default: as many as roots)')
+    parser.add_argument('--depth', type=int, default=3, help='Maximum nesting of compounds within compounds')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    parser.add_argument('--max-year', type=int, help='Latest start year (default: the last rule number)')
+    args = parser.parse_args()
+    generate_lexicon(args.out, args.roots, args.compounds, args.depth, args.seed, args.max_year)
+    compounds = args.roots if args.compounds is None else args.compounds
+    print(f'Wrote {args.roots} roots and {compounds} compounds to {args.out}')
+
+if __name__ == '__main__':
+    main()
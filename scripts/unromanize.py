@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""Read romanized Tovian back as IPA.
+
+List every reading of some words, known words first, or rewrite a whole
+file with the best reading of each word. Readings are ranked against the
+derived forms in the SQLite database the build writes, and those that are
+words of the dictionary are marked with *:
+
+    python scripts/unromanize.py thim shath
+    python scripts/unromanize.py --file text.txt --out text_ipa.txt
+"""
+import argparse
+import sqlite3
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from build_dictionary import consonants, vowels
+from transliteration import RomanizationParser
+
+def load_forms(database):
+    connection = sqlite3.connect(database)
+    try:
+        return [word for word, in connection.execute('SELECT word FROM entries')]
+    finally:
+        connection.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert romanized Tovian to IPA.')
+    parser.add_argument('words', nargs='*', help='Romanized words to list the readings of')
+    parser.add_argument('--file', help='Romanized text to rewrite as IPA')
+    parser.add_argument('--out', help='Where to write the rewritten --file (default: stdout)')
+    parser.add_argument('--database', default=str(ROOT / 'dictionary.sqlite'), help='Dictionary database from build_dictionary.py')
+    parser.add_argument('--no-lexicon', action='store_true', help='Do not rank readings against the dictionary')
+    parser.add_argument('--limit', type=int, default=10, help='Readings to list per word')
+    args = parser.parse_args()
+
+    forms = [] if args.no_lexicon else load_forms(args.database)
+    reader = RomanizationParser(consonants + vowels + '-', forms)
+    for word in args.words:
+        readings = reader.candidates(word, args.limit)
+        print(f'{word}: ' + ', '.join(f'{form}*' if form in reader.forms else form for form in readings))
+    if args.file:
+        with open(args.file, encoding='utf-8') as file:
+            text = reader.normalize(file.read())
+        if args.out:
+            with open(args.out, 'w', encoding='utf-8') as file:
+                file.write(text)
+        else:
+            sys.stdout.write(text)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,215 @@
+"""Single-pass conversion of IPA forms into the orthographies the build
+writes: LaTeX TIPA, the romanization (which is also what the Tovian font
+renders), and the grapheme map the site reads from site/ipa_map.csv, plus
+RomanizationParser for reading romanized text back as IPA.
+
+Each orthography is compiled once into a str.translate table, or into a
+longest-match-first regex when some of its sources are several characters
+long, and results are memoized per (form, target).
+"""
+import csv
+import os
+import re
+from functools import lru_cache
+from itertools import islice
+
+IPA_MAP = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'site', 'ipa_map.csv')
+
+LATEX = {
+    'ʃ': r'{\textesh}',
+    'ŋ': r'{\ng}',
+    'θ': r'{\texttheta}',
+    'ð': r'{\dh}',
+    'ɟ': r'{\textbardotlessj}',
+    'ɬ': r'{\textbeltl}',
+    'ʒ': r'{\textyogh}',
+    'ƛ': r'{\texttoptiebar{t\textbeltl}}',
+    'ə': r'{\textschwa}',
+    'ˈ': r'{\textprimstress}',
+    'j': r'y',
+    'ɸ': r'{\textphi}',
+    't': r'{\textsubbridge{t}}',
+    ':': r'{\textlengthmark}',
+}
+
+# Applied in this order, one replacement after another, so ɟ ends up as y
+ROMANIZATION = [
+    ('ʃ', 'sh'),
+    ('ŋ', 'ng'),
+    ('θ', 'th'),
+    ('ð', 'dh'),
+    ('ɟ', 'j'),
+    ('ɬ', 'lh'),
+    ('ʒ', 'z'),
+    ('j', 'y'),
+    ('ƛ', 'tl'),
+    ('ə', 'e'),
+    ('ɸ', 'f'),
+    ('ħ', 'h'),
+    ('ˈ', r'\''),
+    (':', ':'),
+]
+
+def sequential(replacements):
+    """The single-pass mapping equivalent to running str.replace for each
+    (source, output) pair in order. Sources must be single characters."""
+    mapping = {}
+    for source, _ in replacements:
+        if len(source) != 1:
+            raise ValueError(f'Sequential source {source!r} is not one character')
+        output = source
+        for old, new in replacements:
+            output = output.replace(old, new)
+        mapping.setdefault(source, output)
+    return mapping
+
+class Orthography:
+    """A compiled source -> output mapping; characters without a mapping
+    pass through unchanged."""
+    __slots__ = ('mapping', 'table', 'pattern')
+
+    def __init__(self, mapping):
+        self.mapping = dict(mapping)
+        self.table = None
+        self.pattern = None
+        if all(len(source) == 1 for source in self.mapping):
+            self.table = str.maketrans(self.mapping)
+        else:
+            sources = sorted(self.mapping, key=len, reverse=True)
+            self.pattern = re.compile('|'.join(re.escape(source) for source in sources))
+
+    def convert(self, form):
+        if self.table is not None:
+            return form.translate(self.table)
+        return self.pattern.sub(lambda match: self.mapping[match.group()], form)
+
+def load_ipa_map(filename=IPA_MAP):
+    """Grapheme -> IPA pairs from the site's map, in file order."""
+    with open(filename, encoding='utf-8') as file:
+        reader = csv.reader(file)
+        next(reader)
+        return [(row[0].strip(), row[1].strip()) for row in reader if len(row) >= 2 and row[0].strip()]
+
+def compile_orthography(target):
+    if target == 'latex':
+        return Orthography(LATEX)
+    if target in ('romanization', 'tovian'):
+        return Orthography(sequential(ROMANIZATION))
+    if target == 'ipa_map':
+        # the first grapheme listed for a sound wins
+        mapping = {}
+        for grapheme, ipa in load_ipa_map():
+            mapping.setdefault(ipa, grapheme)
+        return Orthography(mapping)
+    raise ValueError(f'Unknown transliteration target {target!r}')
+
+orthographies = {}
+
+def orthography(target):
+    if target not in orthographies:
+        orthographies[target] = compile_orthography(target)
+    return orthographies[target]
+
+@lru_cache(maxsize=1 << 16)
+def transliterate(form, target):
+    """`form` written in `target`: 'latex', 'romanization', 'tovian' (the
+    romanization, as set in the Tovian font) or 'ipa_map'."""
+    return orthography(target).convert(form)
+
+STRESS = 'ˈ'
+
+class RomanizationParser:
+    """Reads romanized text back as IPA.
+
+    The romanization merges some sounds (ʒ and z are both z, ə and e both
+    e, ɟ and j both y) and spells others with digraphs that can also be two
+    letters (sh, th, ng...), so a romanized word can have several readings.
+    Graphemes are matched with a trie built from the romanization table,
+    longest first, and candidates() ranks the readings that exist in
+    `lexicon` (unstressed IPA forms) ahead of the rest.
+    """
+    __slots__ = ('trie', 'forms', 'prefixes', 'best')
+
+    def __init__(self, alphabet, lexicon=()):
+        mapping = sequential(ROMANIZATION)
+        self.trie = {}
+        for ipa in dict.fromkeys(alphabet + ''.join(mapping)):
+            if ipa != STRESS:
+                self.add(mapping.get(ipa, ipa), ipa)
+        self.forms = set()
+        self.prefixes = set()
+        for form in lexicon:
+            form = form.replace(STRESS, '')
+            self.forms.add(form)
+            self.prefixes.update(form[:end] for end in range(len(form) + 1))
+        # best reading of each token seen by normalize()
+        self.best = {}
+
+    def add(self, grapheme, ipa):
+        node = self.trie
+        for char in grapheme:
+            node = node.setdefault(char, {})
+        node.setdefault(None, []).append(ipa)
+
+    def matches(self, text, start):
+        """(end, IPA readings) of each grapheme at `start`, longest first."""
+        found = []
+        node = self.trie
+        for end in range(start, len(text)):
+            node = node.get(text[end])
+            if node is None:
+                break
+            if None in node:
+                found.append((end + 1, node[None]))
+        if not found:
+            # not something the romanization writes; keep it as it is
+            found.append((start + 1, [text[start]]))
+        found.reverse()
+        return found
+
+    def readings(self, text, known=False):
+        """Every IPA form that romanizes to `text`, longest graphemes first.
+        With `known`, only those that are prefixes of lexicon forms are
+        followed."""
+        if not text:
+            yield ''
+            return
+        matches = [self.matches(text, start) for start in range(len(text))]
+
+        def branches(start):
+            return ((end, ipa) for end, readings in matches[start] for ipa in readings)
+        # depth first with an explicit stack of the branches left at each
+        # grapheme, since a token can be longer than the recursion limit
+        parts = []
+        stack = [branches(0)]
+        while stack:
+            for end, ipa in stack[-1]:
+                if known and ''.join(parts) + ipa not in self.prefixes:
+                    continue
+                if end == len(text):
+                    yield ''.join(parts) + ipa
+                    continue
+                parts.append(ipa)
+                stack.append(branches(end))
+                break
+            else:
+                stack.pop()
+                if parts:
+                    parts.pop()
+
+    def candidates(self, text, limit=32):
+        """Up to `limit` IPA readings of `text`, those in the lexicon first."""
+        text = text.casefold().replace(r"\'", '').replace("'", '')
+        known = [form for form in self.readings(text, known=True) if form in self.forms]
+        others = (form for form in self.readings(text) if form not in self.forms)
+        return (known + list(islice(others, limit)))[:limit]
+
+    def normalize(self, text, token=re.compile(r"[\w\\':-]+")):
+        """Replace each romanized word in `text` by its best IPA reading."""
+        def best(match):
+            word = match.group()
+            if word not in self.best:
+                readings = self.candidates(word, 1)
+                self.best[word] = readings[0] if readings else word
+            return self.best[word]
+        return token.sub(best, text)